@@ -9,7 +9,9 @@ from datetime import datetime
 sys.path.append(os.path.join(os.path.dirname(__file__), 'scripts'))
 sys.path.append(os.path.join(os.path.dirname(__file__), 'utils'))
 
-from query_and_respond import run_query_with_context
+from query_and_respond import run_query_with_context, QUERY_DEADLINE_S
+from compare_policies import run_comparison
+from tenants import list_tenants
 
 # Page configuration
 st.set_page_config(
@@ -191,6 +193,30 @@ def display_result(result):
         # Debug: show raw result
         st.text(f"Raw result: {result}")
 
+def display_comparison(rows):
+    """Display a cross-policy coverage table"""
+    if not rows:
+        st.error("Unable to compare policies. Please try again.")
+        return
+    
+    st.markdown("### Coverage Comparison")
+    st.table([
+        {
+            "Policy": row["doc"],
+            "Answer": row["answer"],
+            "Confidence": f"{row['confidence']:.0%}",
+            "Source Clause": row["source_clause"] or "-",
+            "Pages": ", ".join(str(p) for p in row["pages"]),
+        }
+        for row in rows
+    ])
+    
+    for row in rows:
+        with st.expander(f"{row['doc']}: {row['answer']}"):
+            st.markdown(row["justification"] or "No justification provided")
+            if row["sections"]:
+                st.caption("Sections: " + " | ".join(row["sections"]))
+
 def main():
     # Header
     st.markdown('<h1 class="main-header">Insurance Contract Analyzer</h1>', unsafe_allow_html=True)
@@ -207,6 +233,13 @@ def main():
             index=0
         )
         
+        # Policy library - only shown when client-specific stores exist
+        tenants = list_tenants()
+        tenant = None
+        if tenants:
+            tenant_option = st.selectbox("Policy Library", ["Default"] + tenants, index=0)
+            tenant = None if tenant_option == "Default" else tenant_option
+        
         # Number of chunks - this will be passed to the function
         num_chunks = st.slider(
             "Number of Context Chunks",
@@ -216,6 +249,27 @@ def main():
             help="Number of document chunks to retrieve for analysis"
         )
         
+        # Comparison - one question answered for every policy side by side
+        compare_mode = st.checkbox(
+            "Compare All Policies",
+            value=False,
+            help="Answer the question for each indexed policy and show a coverage table"
+        )
+        
+        # Adaptive depth - num_chunks becomes the maximum retrieval depth
+        adaptive = st.checkbox(
+            "Adaptive Retrieval Depth",
+            value=False,
+            help="Retrieve deeper only for ambiguous questions and cut the context at the first relevance drop"
+        )
+        
+        # Compression - keep only the sentences relevant to the question
+        compress = st.checkbox(
+            "Compress Context",
+            value=False,
+            help="Send only the most relevant sentences (with their section headers) to the LLM"
+        )
+        
         # Temperature - this will be passed to the function
         temperature = st.slider(
             "Response Temperature",
@@ -226,6 +280,16 @@ def main():
             help="Lower values = more consistent, Higher values = more creative"
         )
         
+        # Deadline - overall time budget per question
+        deadline_s = st.slider(
+            "Time Budget (seconds)",
+            min_value=10,
+            max_value=90,
+            value=int(QUERY_DEADLINE_S),
+            step=5,
+            help="Re-ranking is skipped and fewer chunks are used when time runs short; UNKNOWN is returned once it is used up"
+        )
+        
         st.markdown("---")
         st.markdown("### Question Guidelines")
         st.markdown("""
@@ -276,6 +340,7 @@ def main():
         st.metric("Avg Response Time", "~15s")
     
     # Analysis section - moved below the button
+    query_stats = {}
     if analyze_button and query.strip():
         st.markdown("---")
         
@@ -289,11 +354,17 @@ def main():
                 progress_bar.progress(i + 1)
             
             try:
-                # Call the analysis function with the slider values
-                result = run_query_with_context(query, num_chunks, temperature)
-                
-                # Display result
-                display_result(result)
+                if compare_mode:
+                    rows = run_comparison(query, temperature, tenant=tenant, deadline_s=deadline_s, stats=query_stats)
+                    display_comparison(rows)
+                else:
+                    # Call the analysis function with the slider values
+                    result = run_query_with_context(query, num_chunks, temperature, adaptive=adaptive, compress=compress, stats=query_stats, tenant=tenant, deadline_s=deadline_s)
+                    
+                    # Display result
+                    display_result(result)
+                for note in query_stats.get("deadline", {}).get("degraded", []):
+                    st.info(f"Time budget: {note}")
                 
                 # Success message
                 st.success("Analysis completed successfully!")
@@ -313,13 +384,22 @@ def main():
             st.metric("Query Length", f"{len(query)} chars")
         
         with col2:
-            st.metric("Context Chunks", f"{num_chunks}")
+            st.metric("Context Chunks", f"{query_stats.get('context_chunks', num_chunks)}")
         
         with col3:
             st.metric("Temperature", f"{temperature}")
         
         with col4:
-            st.metric("Processing Time", "~15s")
+            timing = query_stats.get("deadline")
+            st.metric("Processing Time", f"{timing['elapsed_s']:.1f}s" if timing else "n/a")
+        
+        if query_stats.get("deadline"):
+            stages = query_stats["deadline"]["stages_ms"]
+            st.caption(" | ".join(f"{name}: {ms / 1000:.2f}s" for name, ms in stages.items()))
+        llm_stats = query_stats.get("llm")
+        if llm_stats and llm_stats["aborted"]:
+            st.caption(f"LLM: {llm_stats['attempts']} attempts, {len(llm_stats['aborted'])} invalid "
+                       f"({'; '.join(llm_stats['aborted'])}), up to {llm_stats['tokens_saved']} tokens saved by early abort")
     
     # Footer
     st.markdown("---")
@@ -0,0 +1,86 @@
+# Compares fixed vs adaptive retrieval depth over test_cases.json (no LLM calls).
+# Run from the repository root: python benchmarks/adaptive_depth_report.py
+
+import sys
+import os
+import json
+import argparse
+from prettytable import PrettyTable
+
+# Add subfolders to path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'scripts'))
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'utils'))
+
+from query_and_respond import retrieve_context, build_context
+from ask_llm import build_user_message
+from vector_store import load_current_snapshot
+
+TEST_FILE = "test_cases.json"
+
+
+def measure(snapshot, queries, num_chunks, adaptive):
+    """Returns per-query (context chunks, prompt chars, approx prompt tokens, widened)."""
+    rows = []
+    for query in queries:
+        context_chunks, stats = retrieve_context(snapshot, query, num_chunks=num_chunks, adaptive=adaptive)
+        prompt = build_user_message(query, build_context(context_chunks))
+        rows.append({
+            "query": query,
+            "context_chunks": stats["context_chunks"],
+            "retrieved": stats["retrieved"],
+            "prompt_chars": len(prompt),
+            "prompt_tokens": sum(c.get("token_count", 0) for c in context_chunks),
+            "widened": stats.get("widened", False),
+        })
+    return rows
+
+
+def summarize(rows):
+    n = max(len(rows), 1)
+    return {
+        "avg_context_chunks": sum(r["context_chunks"] for r in rows) / n,
+        "avg_retrieved": sum(r["retrieved"] for r in rows) / n,
+        "avg_prompt_chars": sum(r["prompt_chars"] for r in rows) / n,
+        "avg_context_tokens": sum(r["prompt_tokens"] for r in rows) / n,
+        "widened": sum(1 for r in rows if r["widened"]),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fixed vs adaptive retrieval depth over test_cases.json")
+    parser.add_argument("--num-chunks", type=int, default=15, help="Fixed depth / adaptive maximum depth")
+    parser.add_argument("--output", help="Optional path for a JSON report")
+    args = parser.parse_args()
+
+    with open(TEST_FILE, "r") as f:
+        queries = [case["query"] for case in json.load(f)]
+
+    snapshot = load_current_snapshot()
+    fixed = measure(snapshot, queries, args.num_chunks, adaptive=False)
+    adaptive = measure(snapshot, queries, args.num_chunks, adaptive=True)
+
+    table = PrettyTable(["Query", "Fixed chunks", "Adaptive chunks", "Fixed prompt", "Adaptive prompt"])
+    for f_row, a_row in zip(fixed, adaptive):
+        table.add_row([f_row["query"][:40] + "...", f_row["context_chunks"], a_row["context_chunks"],
+                       f_row["prompt_chars"], a_row["prompt_chars"]])
+    print("\n" + table.get_string())
+
+    report = {"num_chunks": args.num_chunks, "store_version": snapshot.version,
+              "fixed": summarize(fixed), "adaptive": summarize(adaptive)}
+    for mode in ("fixed", "adaptive"):
+        s = report[mode]
+        print(f"📊 {mode:>8}: {s['avg_context_chunks']:.1f} chunks, {s['avg_prompt_chars']:.0f} prompt chars, "
+              f"~{s['avg_context_tokens']:.0f} context tokens (widened {s['widened']}/{len(queries)})")
+
+    saved = 1 - report["adaptive"]["avg_prompt_chars"] / max(report["fixed"]["avg_prompt_chars"], 1)
+    print(f"📉 Adaptive mode sends {saved:.1%} fewer prompt characters")
+
+    if args.output:
+        report["queries"] = {"fixed": fixed, "adaptive": adaptive}
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"✅ Report saved to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+# Shared helpers for the benchmark scripts: percentiles, peak RSS and machine-readable results.
+
+import os
+import sys
+import json
+import time
+import platform
+import resource
+import subprocess
+from datetime import datetime, timezone
+
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+
+
+def percentiles(values, points=(50, 95, 99)):
+    """Nearest-rank percentiles of `values` as {"p50": ..., "p95": ..., "p99": ...}."""
+    if not values:
+        return {f"p{p}": None for p in points}
+    ordered = sorted(values)
+    result = {}
+    for p in points:
+        rank = max(1, -(-p * len(ordered) // 100))  # ceil(p/100 * n)
+        result[f"p{p}"] = ordered[rank - 1]
+    return result
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process in MB."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is KB on Linux, bytes on macOS
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (subprocess.CalledProcessError, FileNotFoundError):
+        return "unknown"
+
+
+def run_metadata():
+    return {
+        "commit": git_commit(),
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "cpus": os.cpu_count(),
+    }
+
+
+def save_results(name, payload, output=None):
+    """Writes `payload` (plus run metadata) to `output` or benchmarks/results/<name>-<commit>-<time>.json."""
+    payload = {"benchmark": name, **run_metadata(), **payload}
+    if output is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+        output = os.path.join(RESULTS_DIR, f"{name}-{payload['commit']}-{stamp}.json")
+    with open(output, "w") as f:
+        json.dump(payload, f, indent=2)
+    return output
+
+
+class Timer:
+    """Collects per-item latencies (ms) and total wall time."""
+
+    def __init__(self):
+        self.latencies_ms = []
+        self.start = time.perf_counter()
+
+    def measure(self, fn, *args, **kwargs):
+        t0 = time.perf_counter()
+        result = fn(*args, **kwargs)
+        self.latencies_ms.append((time.perf_counter() - t0) * 1000)
+        return result
+
+    @property
+    def elapsed(self):
+        return time.perf_counter() - self.start
@@ -0,0 +1,95 @@
+# Scatter-gather benchmark: query latency of sharded search (one worker process per shard) as the
+# shard count varies, against a single in-process IndexFlatL2 over the same vectors.
+#
+# Run from the repository root:
+#   python benchmarks/bench_shards.py --scale 1000000 --shard-counts 1 2 4 8
+
+import sys
+import os
+import shutil
+import argparse
+import tempfile
+
+import numpy as np
+import faiss
+
+sys.path.append(os.path.dirname(__file__))
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'utils'))
+
+from bench_common import percentiles, save_results, Timer
+from run_scale_bench import _random_vectors
+from shards import SHARD_FILE, ShardedSearcher, build_shard_indexes
+
+
+def write_shards(vectors, num_shards, out_dir):
+    """Hash-style round-robin split of the vectors into shard index files. Returns their paths."""
+    assignments = [list(range(i, len(vectors), num_shards)) for i in range(num_shards)]
+    paths = []
+    for i, index in enumerate(build_shard_indexes(vectors, assignments)):
+        paths.append(os.path.join(out_dir, SHARD_FILE.format(i)))
+        faiss.write_index(index, paths[-1])
+    return paths
+
+
+def time_queries(index, queries, top_k):
+    timer = Timer()
+    for query in queries:
+        timer.measure(index.search, query.reshape(1, -1), top_k)
+    return {"seconds": timer.elapsed, "qps": len(queries) / timer.elapsed, "latency_ms": percentiles(timer.latencies_ms)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Latency of sharded scatter-gather search vs. shard count")
+    parser.add_argument("--scale", type=int, default=200_000, help="Corpus size in vectors")
+    parser.add_argument("--shard-counts", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=15)
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Result file (default: benchmarks/results/shards-<commit>-<time>.json)")
+    args = parser.parse_args()
+
+    vectors = _random_vectors(args.scale, args.dim, args.seed)
+    queries = _random_vectors(args.queries, args.dim, args.seed + 1)
+
+    print(f"⏱️ single process @ {args.scale}...", flush=True)
+    baseline = faiss.IndexFlatL2(args.dim)
+    baseline.add(vectors)
+    expected = baseline.search(queries, args.top_k)[1]
+    results = [{"shards": 0, **time_queries(baseline, queries, args.top_k)}]
+    del baseline
+
+    work_dir = tempfile.mkdtemp(prefix="shard-bench-")
+    try:
+        for num_shards in args.shard_counts:
+            print(f"⏱️ {num_shards} shard(s) @ {args.scale}...", flush=True)
+            shard_dir = os.path.join(work_dir, str(num_shards))
+            os.makedirs(shard_dir)
+            searcher = ShardedSearcher(write_shards(vectors, num_shards, shard_dir))
+            try:
+                searcher.search(queries[:1], args.top_k)  # warm up workers and page in the mapped indexes
+                record = {"shards": num_shards, **time_queries(searcher, queries, args.top_k)}
+                record["recall_vs_single"] = float(np.mean([
+                    len(set(searcher.search(q.reshape(1, -1), args.top_k)[1][0]) & set(e)) / args.top_k
+                    for q, e in zip(queries, expected)
+                ]))
+            finally:
+                searcher.close()
+            results.append(record)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    print(f"\n{'shards':>8} {'qps':>10} {'p50 ms':>10} {'p95 ms':>10} {'p99 ms':>10} {'recall':>8}")
+    for record in results:
+        lat = record["latency_ms"]
+        recall = f"{record['recall_vs_single']:.3f}" if "recall_vs_single" in record else "-"
+        print(f"{record['shards'] or 'single':>8} {record['qps']:>10.1f} {lat['p50']:>10.2f} "
+              f"{lat['p95']:>10.2f} {lat['p99']:>10.2f} {recall:>8}")
+
+    params = {k: v for k, v in vars(args).items() if k != "output"}
+    path = save_results("shards", {"params": params, "results": results}, args.output)
+    print(f"✅ Results saved to {path}")
+
+
+if __name__ == "__main__":
+    main()
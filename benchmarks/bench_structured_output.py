@@ -0,0 +1,210 @@
+# Fuzz and benchmark suite for utils/structured_output.py.
+# Run from the repository root: python benchmarks/bench_structured_output.py [--iterations N] [--output FILE]
+
+import sys
+import os
+import re
+import json
+import time
+import random
+import argparse
+import multiprocessing
+
+# Add subfolders to path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'utils'))
+
+from structured_output import parse_llm_response, validate_response, iter_json_candidates
+
+VALID = {
+    "answer": "YES",
+    "justification": "Section 4.2 {Air Ambulance} covers \"emergency\" transfers up to 150 km.",
+    "source_clause": "Section 4.2",
+    "confidence": 0.87,
+}
+VALID_JSON = json.dumps(VALID, indent=2)
+
+
+def legacy_extract_json(text):
+    """The regex-based extract_json this module replaced, kept for comparison."""
+    patterns = [
+        r'\{[^{}]*(?:\{[^{}]*\}[^{}]*)*\}',
+        r'\{.*?\}',
+        r'\{[^}]*"answer"[^}]*"justification"[^}]*"source_clause"[^}]*"confidence"[^}]*\}',
+    ]
+    for pattern in patterns:
+        for match in re.findall(pattern, text, re.DOTALL):
+            try:
+                cleaned = match.replace('\\n', '\n').replace('\\"', '"').replace("\\'", "'").replace('\\\\', '\\')
+                cleaned = re.sub(r',\s*}', '}', cleaned)
+                cleaned = re.sub(r',\s*]', ']', cleaned)
+                parsed = json.loads(cleaned)
+                if all(key in parsed for key in ["answer", "justification", "source_clause", "confidence"]):
+                    return cleaned
+            except json.JSONDecodeError:
+                continue
+    return None
+
+
+# === Recoverable outputs: the parser must return the expected answer ===
+def recoverable_cases():
+    compact = json.dumps(VALID)
+    python_style = ("{'answer': 'YES', 'justification': 'It\\'s covered under Section 4.2', "
+                    "'source_clause': 'Section 4.2', 'confidence': 0.87, }")
+    return {
+        "plain": VALID_JSON,
+        "prose_wrapped": f"Based on the context, here is my answer:\n{VALID_JSON}\nLet me know if you need more.",
+        "code_fence": f"```json\n{VALID_JSON}\n```",
+        "trailing_comma": compact[:-1] + ",}",
+        "python_literals": python_style,
+        "unquoted_keys": '{answer: "YES", justification: "covered", source_clause: null, confidence: 0.9}',
+        "lowercase_answer": compact.replace('"YES"', '"yes"'),
+        "percent_confidence": compact.replace("0.87", "87"),
+        "raw_newline_in_string": compact.replace("covers", "covers\n"),
+        "truncated_closing_brace": compact[:-1],
+        "stray_open_brace_prefix": "{ Note: {" + compact,
+        "smart_quotes": compact.replace('"', "“", 1).replace('"answer"', '“answer”'),
+        "nested_wrapper": json.dumps({"response": VALID}),
+        "deep_prefix_nesting": "{" * 5000 + compact,
+        "example_then_answer": '{"answer": "NO"} ' + compact,
+    }
+
+
+# === Pathological outputs: the parser must not crash or hang, any result must be schema-valid ===
+def pathological_cases(size):
+    return {
+        "open_braces": "{" * size,
+        "close_braces": "}" * size,
+        "empty_object_run": "{" + "{}" * (size // 2),
+        "balanced_deep": "{" * (size // 2) + "}" * (size // 2),
+        "unterminated_string": '{"justification": "' + "x" * size,
+        "escaped_quote_run": '{"a": "' + '\\"' * (size // 2),
+        "brace_soup": "".join(random.Random(size).choice('{}":,\\ a') for _ in range(size)),
+        "many_small_objects": '{"answer": "MAYBE"} ' * (size // 20),
+        "lazy_regex_trap": "{" + '"a": "}' * (size // 7),
+    }
+
+
+def mutate(text, rng, edits=3):
+    chars = list(text)
+    for _ in range(edits):
+        op = rng.choice(("insert", "delete", "replace"))
+        pos = rng.randrange(len(chars) + (op == "insert"))
+        if op == "insert":
+            chars.insert(pos, rng.choice('{}[]",:\\\n\' '))
+        elif chars and op == "delete":
+            del chars[min(pos, len(chars) - 1)]
+        elif chars:
+            chars[min(pos, len(chars) - 1)] = rng.choice('{}[]",:\\\n\' ')
+    return "".join(chars)
+
+
+def check_invariants(text):
+    """Returns an error string if parse_llm_response violates its contract on `text`."""
+    try:
+        result = parse_llm_response(text)
+    except Exception as e:
+        return f"raised {type(e).__name__}: {e}"
+    if result is not None and validate_response(result) != result:
+        return f"returned a non-normalized result: {result}"
+    total = sum(len(c) for c in iter_json_candidates(text))
+    if total > 2 * len(text) + 1:
+        return f"candidate volume {total} is not linear in input length {len(text)}"
+    return None
+
+
+def run_fuzz(iterations, seed):
+    rng = random.Random(seed)
+    failures = []
+
+    for name, text in recoverable_cases().items():
+        result = parse_llm_response(text)
+        if not result or result["answer"] != "YES":
+            failures.append(f"recoverable/{name}: got {result}")
+
+    for size in (100, 10_000):
+        for name, text in pathological_cases(size).items():
+            error = check_invariants(text)
+            if error:
+                failures.append(f"pathological/{name}[{size}]: {error}")
+
+    # Random edits of valid output (and of every truncation point) must never crash the parser
+    bases = list(recoverable_cases().values())
+    for i in range(iterations):
+        base = rng.choice(bases)
+        text = mutate(base, rng, edits=rng.randint(1, 6)) if i % 2 else base[:rng.randrange(len(base) + 1)]
+        error = check_invariants(text)
+        if error:
+            failures.append(f"fuzz/{i}: {error} on {text!r}")
+
+    return failures
+
+
+def _timed(fn, text, repeats):
+    start = time.perf_counter()
+    for _ in range(repeats):
+        fn(text)
+    return (time.perf_counter() - start) / repeats * 1000
+
+
+def _timed_worker(fn_name, text, repeats, queue):
+    queue.put(_timed(globals()[fn_name], text, repeats))
+
+
+def time_with_timeout(fn_name, text, repeats, timeout):
+    """Average ms per call, or None if the run exceeds `timeout` seconds (e.g. regex backtracking)."""
+    queue = multiprocessing.Queue()
+    proc = multiprocessing.Process(target=_timed_worker, args=(fn_name, text, repeats, queue))
+    proc.start()
+    proc.join(timeout)
+    if proc.is_alive():
+        proc.terminate()
+        proc.join()
+        return None
+    return queue.get() if not queue.empty() else None
+
+
+def run_benchmark(sizes, repeats, timeout):
+    results = []
+    for size in sizes:
+        cases = pathological_cases(size)
+        filler = "The policy wording says { see annexure } and more. " * (size // 50)
+        cases["prose_then_valid"] = filler + VALID_JSON
+        for name, text in cases.items():
+            new_ms = time_with_timeout("parse_llm_response", text, repeats, timeout)
+            old_ms = time_with_timeout("legacy_extract_json", text, repeats, timeout)
+            results.append({"case": name, "size": len(text), "parser_ms": new_ms, "legacy_regex_ms": old_ms})
+            old = f"{old_ms:9.3f} ms" if old_ms is not None else f" >{timeout:.0f} s (timeout)"
+            new = f"{new_ms:9.3f} ms" if new_ms is not None else f" >{timeout:.0f} s (timeout)"
+            print(f"  {name:<22} {len(text):>9} chars   parser {new}   legacy {old}")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fuzz and benchmark the structured-output parser")
+    parser.add_argument("--iterations", type=int, default=5000, help="Random fuzz inputs")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_000, 10_000, 100_000])
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--timeout", type=float, default=10.0, help="Seconds before a timed run is abandoned")
+    parser.add_argument("--output", help="Optional path for a JSON report")
+    args = parser.parse_args()
+
+    print(f"🧪 Fuzzing parse_llm_response ({args.iterations} random inputs)...")
+    failures = run_fuzz(args.iterations, args.seed)
+    for failure in failures[:20]:
+        print(f"❌ {failure}")
+    print(f"{'✅' if not failures else '❌'} {len(failures)} fuzz failures")
+
+    print("\n⏱️ Benchmarking against the legacy regex extractor...")
+    results = run_benchmark(args.sizes, args.repeats, args.timeout)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"fuzz_failures": failures, "benchmark": results}, f, indent=2)
+        print(f"✅ Report saved to {args.output}")
+
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,172 @@
+# Replays a captured query log (outputs/query_log.jsonl) against the pipeline at the original pace
+# or a scaled one, with bounded concurrency, and reports throughput and p50/p95/p99 per stage.
+#
+# Run from the repository root:
+#   python benchmarks/replay_queries.py --rate-scale 4 --concurrency 8
+#   python benchmarks/replay_queries.py --retrieval-only --rate-scale 0   # as fast as possible, no LLM calls
+
+import sys
+import os
+import time
+import json
+import argparse
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.append(os.path.dirname(__file__))
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'scripts'))
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'utils'))
+
+from bench_common import percentiles, save_results
+from query_log import query_log_path, read_query_log
+
+
+def load_records(path, limit=None, source=None):
+    records = [r for r in read_query_log(path) if r.get("query") and (source is None or r.get("source") == source)]
+    records.sort(key=lambda r: r.get("epoch", 0))
+    return records[:limit] if limit else records
+
+
+def schedule(records, rate_scale):
+    """Start offsets (s) relative to the first query; rate_scale=2 replays twice as fast, 0 all at once."""
+    if not records or rate_scale <= 0:
+        return [0.0] * len(records)
+    first = records[0].get("epoch", 0)
+    return [(r.get("epoch", first) - first) / rate_scale for r in records]
+
+
+def replay_one(record, retrieval_only):
+    from query_and_respond import run_query_with_context, retrieve_context, QUERY_DEADLINE_S
+    from compare_policies import run_comparison, retrieve_comparison_context
+    from retrieval import build_context
+    from tenants import acquire_store
+    from deadline import Deadline
+
+    params = record.get("params", {})
+    stats = {}
+    t0 = time.perf_counter()
+    if record.get("source") == "compare":
+        deadline = Deadline(params.get("deadline_s", QUERY_DEADLINE_S))
+        if retrieval_only:
+            with acquire_store(params.get("tenant")) as snapshot:
+                retrieve_comparison_context(snapshot, record["query"], deadline, docs=params.get("docs"))
+            stats["deadline"] = deadline.report()
+        else:
+            run_comparison(record["query"], params.get("temperature", 0.1), tenant=params.get("tenant"),
+                           deadline_s=params.get("deadline_s", QUERY_DEADLINE_S), stats=stats, docs=params.get("docs"))
+        answer = None
+    elif retrieval_only:
+        deadline = Deadline(params.get("deadline_s", QUERY_DEADLINE_S))
+        with acquire_store(params.get("tenant")) as snapshot:
+            chunks, stats = retrieve_context(snapshot, record["query"], params.get("num_chunks", 15),
+                                             adaptive=params.get("adaptive", False),
+                                             compress=params.get("compress", False), deadline=deadline)
+            build_context(chunks)
+        stats["deadline"] = deadline.report()
+        answer = None
+    else:
+        answer = run_query_with_context(record["query"], params.get("num_chunks", 15), params.get("temperature", 0.1),
+                                        adaptive=params.get("adaptive", False), compress=params.get("compress", False),
+                                        stats=stats, tenant=params.get("tenant"),
+                                        deadline_s=params.get("deadline_s", QUERY_DEADLINE_S))
+    return {
+        "latency_ms": (time.perf_counter() - t0) * 1000,
+        "stages_ms": stats.get("deadline", {}).get("stages_ms", {}),
+        "degraded": bool(stats.get("deadline", {}).get("degraded")),
+        "answer": answer,
+    }
+
+
+def replay(records, rate_scale=1.0, concurrency=4, retrieval_only=False):
+    """Issues every record at its scheduled offset on a pool of `concurrency` workers."""
+    offsets = schedule(records, rate_scale)
+    results = [None] * len(records)
+    lock = threading.Lock()
+
+    def run(i, scheduled_at):
+        started = time.perf_counter()
+        try:
+            result = replay_one(records[i], retrieval_only)
+        except Exception as e:
+            result = {"error": f"{type(e).__name__}: {e}"}
+        result["queue_ms"] = (started - scheduled_at) * 1000
+        with lock:
+            results[i] = result
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for i, offset in enumerate(offsets):
+            delay = start + offset - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            pool.submit(run, i, start + offset)
+    return results, time.perf_counter() - start
+
+
+def summarize(results, wall_s):
+    ok = [r for r in results if "error" not in r]
+    stages = sorted({name for r in ok for name in r["stages_ms"]})
+    answers = Counter()
+    for r in ok:
+        if r["answer"]:
+            try:
+                answers[json.loads(r["answer"]).get("answer")] += 1
+            except ValueError:
+                answers["invalid"] += 1
+    return {
+        "queries": len(results),
+        "errors": len(results) - len(ok),
+        "error_samples": sorted({r["error"] for r in results if "error" in r})[:5],
+        "wall_s": wall_s,
+        "throughput_qps": len(ok) / wall_s if wall_s else None,
+        "degraded": sum(r["degraded"] for r in ok),
+        "latency_ms": {
+            "total": percentiles([r["latency_ms"] for r in ok]),
+            "queue": percentiles([r["queue_ms"] for r in ok]),
+            **{name: percentiles([r["stages_ms"][name] for r in ok if name in r["stages_ms"]]) for name in stages},
+        },
+        "answers": dict(answers),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay a captured query log and report per-stage latency")
+    parser.add_argument("--log", default=None, help=f"Query log to replay (default: {query_log_path() or 'QUERY_LOG_PATH'})")
+    parser.add_argument("--rate-scale", type=float, default=1.0,
+                        help="Speed-up over the captured arrival rate (2 = twice as fast, 0 = no pacing)")
+    parser.add_argument("--concurrency", type=int, default=4, help="Queries in flight at once")
+    parser.add_argument("--limit", type=int, help="Replay only the first N queries")
+    parser.add_argument("--source", choices=["app", "cli", "compare"], help="Replay only queries from this entry point")
+    parser.add_argument("--retrieval-only", action="store_true", help="Stop before the LLM call (no API usage)")
+    parser.add_argument("--output", help="Result file (default: benchmarks/results/replay-<commit>-<time>.json)")
+    args = parser.parse_args()
+
+    records = load_records(args.log, args.limit, args.source)
+    if not records:
+        print("❌ No queries to replay")
+        return
+    os.environ["QUERY_LOG_PATH"] = ""  # Replayed queries must not be appended to the log being replayed
+
+    span = records[-1].get("epoch", 0) - records[0].get("epoch", 0)
+    print(f"🔁 Replaying {len(records)} queries captured over {span:.0f}s "
+          f"(rate x{args.rate_scale or '∞'}, concurrency {args.concurrency})...")
+    results, wall_s = replay(records, args.rate_scale, args.concurrency, args.retrieval_only)
+    summary = summarize(results, wall_s)
+
+    print(f"✅ {summary['queries'] - summary['errors']}/{summary['queries']} ok in {wall_s:.1f}s "
+          f"→ {summary['throughput_qps']:.2f} queries/s ({summary['degraded']} degraded)")
+    print(f"{'stage':<10} {'p50 ms':>10} {'p95 ms':>10} {'p99 ms':>10}")
+    for name, lat in summary["latency_ms"].items():
+        if lat["p50"] is not None:
+            print(f"{name:<10} {lat['p50']:>10.1f} {lat['p95']:>10.1f} {lat['p99']:>10.1f}")
+    for error in summary["error_samples"]:
+        print(f"   ❌ {error}")
+
+    params = {k: v for k, v in vars(args).items() if k != "output"}
+    path = save_results("replay", {"params": params, "summary": summary}, args.output)
+    print(f"✅ Results saved to {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,263 @@
+# Scale benchmark: runs each pipeline stage in isolation over synthetic corpora and records
+# throughput, latency percentiles and peak RSS as JSON that can be compared across commits.
+#
+# Run from the repository root:
+#   python benchmarks/run_scale_bench.py --scales 10000 100000 1000000
+#   python benchmarks/run_scale_bench.py --stages index_build search --scales 1000000
+#   python benchmarks/run_scale_bench.py --compare benchmarks/results/old.json benchmarks/results/new.json
+
+import sys
+import os
+import json
+import argparse
+import multiprocessing
+from queue import Empty
+
+sys.path.append(os.path.dirname(__file__))
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'scripts'))
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'utils'))
+
+from bench_common import percentiles, peak_rss_mb, save_results, Timer
+
+DATA_DIR = "data"
+STAGES = ["extract", "chunk", "embed", "index_build", "search", "rerank", "context"]
+# Stages whose per-item cost doesn't depend on corpus size run once, not once per scale
+PER_QUERY_STAGES = {"extract", "rerank", "context"}
+
+
+# === Stages (each runs in a fresh process so peak RSS is its own) ===
+def stage_extract(scale, args):
+    from extraction import extract_text_from_pdf
+
+    pdfs = [os.path.join(DATA_DIR, f) for f in sorted(os.listdir(DATA_DIR)) if f.endswith(".pdf")]
+    timer = Timer()
+    pages = 0
+    for _ in range(args.extract_passes):
+        for pdf in pdfs:
+            pages += len(timer.measure(extract_text_from_pdf, pdf))
+    return {"items": pages, "unit": "pages", "seconds": timer.elapsed, "latencies_ms": timer.latencies_ms,
+            "latency_unit": "pdf"}
+
+
+def stage_chunk(scale, args):
+    from transformers import AutoTokenizer
+    from chunking import improved_semantic_chunk_pdf_text
+    from synthetic_corpus import SyntheticCorpus
+
+    tokenizer = AutoTokenizer.from_pretrained("sentence-transformers/all-mpnet-base-v2")
+    pages = list(SyntheticCorpus(seed=args.seed).pages(min(scale, args.sample_cap)))
+    timer = Timer()
+    chunks = 0
+    for doc, page_num, text in pages:
+        page_chunks, _ = timer.measure(improved_semantic_chunk_pdf_text, text, doc, page_num, tokenizer=tokenizer)
+        chunks += len(page_chunks)
+    return {"items": chunks, "unit": "chunks", "seconds": timer.elapsed, "latencies_ms": timer.latencies_ms,
+            "latency_unit": "page", "sampled": scale > args.sample_cap}
+
+
+def stage_embed(scale, args):
+    from models import get_embedder
+    from synthetic_corpus import SyntheticCorpus
+
+    embedder = get_embedder()
+    texts = [c["text"] for c in SyntheticCorpus(seed=args.seed).chunks(min(scale, args.sample_cap))]
+    timer = Timer()
+    for i in range(0, len(texts), args.batch_size):
+        timer.measure(embedder.encode, texts[i:i + args.batch_size])
+    return {"items": len(texts), "unit": "chunks", "seconds": timer.elapsed, "latencies_ms": timer.latencies_ms,
+            "latency_unit": f"batch of {args.batch_size}", "sampled": scale > args.sample_cap}
+
+
+def _random_vectors(n, dim, seed):
+    import numpy as np
+    rng = np.random.default_rng(seed)
+    vectors = np.empty((n, dim), dtype="float32")
+    for i in range(0, n, 100_000):  # fill in blocks to bound temporary memory
+        block = rng.standard_normal((min(100_000, n - i), dim), dtype="float32")
+        vectors[i:i + len(block)] = block / np.linalg.norm(block, axis=1, keepdims=True)
+    return vectors
+
+
+def stage_index_build(scale, args):
+    import faiss
+    vectors = _random_vectors(scale, args.dim, args.seed)
+    timer = Timer()
+    index = faiss.IndexFlatL2(args.dim)
+    for i in range(0, scale, 100_000):
+        timer.measure(index.add, vectors[i:i + 100_000])
+    return {"items": index.ntotal, "unit": "vectors", "seconds": timer.elapsed,
+            "latencies_ms": timer.latencies_ms, "latency_unit": "add of 100k"}
+
+
+def stage_search(scale, args):
+    import faiss
+    from retrieval import retrieve_chunks
+
+    index = faiss.IndexFlatL2(args.dim)
+    index.add(_random_vectors(scale, args.dim, args.seed))
+    # Lightweight metadata: hydration cost without holding `scale` chunk texts in memory
+    metadata = [{"doc": "synthetic.pdf", "page": i // 2, "chunk_index": i % 2, "text": ""} for i in range(scale)]
+    queries = _random_vectors(args.queries, args.dim, args.seed + 1)
+
+    timer = Timer()
+    for query in queries:
+        timer.measure(retrieve_chunks, index, metadata, query, args.top_k)
+    return {"items": len(queries), "unit": "queries", "seconds": timer.elapsed,
+            "latencies_ms": timer.latencies_ms, "latency_unit": "query"}
+
+
+def _candidate_sets(args):
+    import random
+    from synthetic_corpus import SyntheticCorpus
+
+    corpus = SyntheticCorpus(seed=args.seed)
+    pool = list(corpus.chunks(args.queries * args.top_k))
+    rng = random.Random(args.seed)
+    sets = []
+    for q, query in enumerate(corpus.queries(args.queries)):
+        candidates = []
+        distances = sorted(rng.uniform(0.6, 1.2) for _ in range(args.top_k))
+        for j, distance in enumerate(distances):
+            chunk = dict(pool[q * args.top_k + j])
+            chunk.update(id=q * args.top_k + j, distance=distance)
+            candidates.append(chunk)
+        sets.append((query, candidates))
+    return sets
+
+
+def stage_rerank(scale, args):
+    from rerank import cascade_rerank
+    from models import get_cross_encoder
+
+    get_cross_encoder()  # load up front so a missing model fails the stage instead of timing the fallback
+    sets = _candidate_sets(args)
+    timer = Timer()
+    for query, candidates in sets:
+        timer.measure(cascade_rerank, query, candidates, top_n=10, cache=None)
+    return {"items": len(sets), "unit": "queries", "seconds": timer.elapsed, "latencies_ms": timer.latencies_ms,
+            "latency_unit": f"query ({args.top_k} candidates)"}
+
+
+def stage_context(scale, args):
+    from retrieval import build_context
+
+    sets = _candidate_sets(args)
+
+    def assemble(query, chunks):
+        if args.compress:
+            from compress import compress_chunks
+            chunks, _ = compress_chunks(query, chunks)
+        return build_context(chunks)
+
+    timer = Timer()
+    for query, candidates in sets:
+        timer.measure(assemble, query, candidates[:10])
+    return {"items": len(sets), "unit": "queries", "seconds": timer.elapsed, "latencies_ms": timer.latencies_ms,
+            "latency_unit": "query" + (" (with compression)" if args.compress else "")}
+
+
+def _stage_worker(stage, scale, args, queue):
+    try:
+        result = globals()[f"stage_{stage}"](scale, args)
+        result["peak_rss_mb"] = peak_rss_mb()
+        queue.put(result)
+    except Exception as e:
+        queue.put({"error": f"{type(e).__name__}: {e}"})
+
+
+def run_stage(stage, scale, args):
+    """Runs one stage in a spawned process; returns its result record."""
+    ctx = multiprocessing.get_context("spawn")
+    queue = ctx.Queue()
+    proc = ctx.Process(target=_stage_worker, args=(stage, scale, args, queue))
+    proc.start()
+    result = None
+    while result is None:
+        try:
+            result = queue.get(timeout=1)
+        except Empty:
+            if not proc.is_alive():
+                result = {"error": f"worker exited with code {proc.exitcode} (out of memory?)"}
+    proc.join()
+
+    record = {"stage": stage, "scale": scale}
+    if "error" in result:
+        record["error"] = result["error"]
+        return record
+
+    latencies = result.pop("latencies_ms")
+    record.update(result)
+    record["throughput_per_s"] = result["items"] / result["seconds"] if result["seconds"] else None
+    record["latency_ms"] = percentiles(latencies)
+    return record
+
+
+def compare(old_path, new_path):
+    with open(old_path) as f:
+        old = json.load(f)
+    with open(new_path) as f:
+        new = json.load(f)
+    old_records = {(r["stage"], r["scale"]): r for r in old["results"] if "error" not in r}
+
+    print(f"📊 {old['commit']} → {new['commit']}")
+    print(f"{'stage':<12} {'scale':>9} {'throughput':>22} {'p95 ms':>22} {'peak RSS MB':>22}")
+    for record in new["results"]:
+        before = old_records.get((record["stage"], record["scale"]))
+        if before is None or "error" in record:
+            continue
+
+        def delta(a, b):
+            if a is None or b is None:
+                return "n/a"
+            change = f"{(b - a) / a:+.0%}" if a else ""
+            return f"{a:.1f}→{b:.1f} {change}"
+
+        print(f"{record['stage']:<12} {record['scale'] or '-':>9} "
+              f"{delta(before['throughput_per_s'], record['throughput_per_s']):>22} "
+              f"{delta(before['latency_ms']['p95'], record['latency_ms']['p95']):>22} "
+              f"{delta(before['peak_rss_mb'], record['peak_rss_mb']):>22}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-stage scale benchmark over synthetic policy corpora")
+    parser.add_argument("--stages", nargs="+", choices=STAGES, default=STAGES)
+    parser.add_argument("--scales", type=int, nargs="+", default=[10_000, 100_000], help="Corpus sizes in chunks")
+    parser.add_argument("--sample-cap", type=int, default=5_000,
+                        help="Max items for model-bound stages (chunk, embed); throughput is per item")
+    parser.add_argument("--queries", type=int, default=200, help="Queries for search/rerank/context")
+    parser.add_argument("--top-k", type=int, default=15)
+    parser.add_argument("--dim", type=int, default=768, help="Embedding dimension (all-mpnet-base-v2: 768)")
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--extract-passes", type=int, default=3)
+    parser.add_argument("--compress", action="store_true", help="Include compression in the context stage")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Result file (default: benchmarks/results/scale-<commit>-<time>.json)")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"), help="Compare two result files and exit")
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    results = []
+    for stage in args.stages:
+        scales = [None] if stage in PER_QUERY_STAGES else args.scales
+        for scale in scales:
+            print(f"⏱️ {stage} @ {scale or 'per-query'}...", flush=True)
+            record = run_stage(stage, scale, args)
+            results.append(record)
+            if "error" in record:
+                print(f"   ❌ {record['error']}")
+            else:
+                lat = record["latency_ms"]
+                print(f"   {record['throughput_per_s']:.1f} {record['unit']}/s, "
+                      f"p50 {lat['p50']:.2f} / p95 {lat['p95']:.2f} / p99 {lat['p99']:.2f} ms per {record['latency_unit']}, "
+                      f"peak RSS {record['peak_rss_mb']:.0f} MB")
+
+    params = {k: v for k, v in vars(args).items() if k not in ("output", "compare")}
+    path = save_results("scale", {"params": params, "results": results}, args.output)
+    print(f"✅ Results saved to {path}")
+
+
+if __name__ == "__main__":
+    main()
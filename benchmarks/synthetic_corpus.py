@@ -0,0 +1,114 @@
+# Synthesizes policy-like corpora at arbitrary scale from the real extracted policy texts.
+
+import os
+import re
+import sys
+import random
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'utils'))
+
+from chunking import split_sentences
+from extraction import PAGE_STORE_DIR, PageStore
+
+EXTRACTED_TEXT_DIR = "outputs/extracted_texts"  # Text dumps written by ingest before the page store
+WORDS_PER_CHUNK = 170  # Roughly the 150-300 token chunks produced at ingest
+
+
+def load_source_pages(text_dir=EXTRACTED_TEXT_DIR, page_store_dir=PAGE_STORE_DIR):
+    """Source pages as [(doc, page_number, text), ...], from the page store when it has any documents,
+    otherwise from the older `--- Page N ---` text dumps."""
+    store = PageStore(page_store_dir)
+    documents = store.documents()
+    if documents:
+        return [(doc, page_num, text) for doc, key in documents.items() for text, page_num in store.read(key)]
+
+    pages = []
+    for filename in sorted(os.listdir(text_dir)):
+        if not filename.endswith(".txt"):
+            continue
+        with open(os.path.join(text_dir, filename), "r", encoding="utf-8") as f:
+            content = f.read()
+        doc = filename.replace(".txt", ".pdf")
+        for match in re.finditer(r"--- Page (\d+) ---\n(.*?)(?=\n--- Page \d+ ---|\Z)", content, re.DOTALL):
+            text = match.group(2).strip()
+            if text:
+                pages.append((doc, int(match.group(1)), text))
+    return pages
+
+
+def load_sentence_pool(text_dir=EXTRACTED_TEXT_DIR, page_store_dir=PAGE_STORE_DIR):
+    """All sentences of the source corpus, keeping clause-like ordering within each page."""
+    pool = []
+    for _, _, text in load_source_pages(text_dir, page_store_dir):
+        pool.extend(s for s in split_sentences(text) if len(s.split()) >= 4)
+    return pool
+
+
+def _perturb(sentence, rng):
+    # Vary amounts, limits and clause numbers so the synthetic corpus isn't a pure duplicate
+    return re.sub(r"\d+", lambda m: str(max(1, int(m.group(0)) + rng.randint(-9, 9))), sentence)
+
+
+class SyntheticCorpus:
+    """Deterministic generator of policy-like documents built from real policy sentences.
+
+    Each synthetic page strings together runs of consecutive source sentences (so clause structure
+    and section headers survive) with numbers perturbed. Sizes are expressed in chunks.
+    """
+
+    def __init__(self, seed=0, text_dir=EXTRACTED_TEXT_DIR, pages_per_doc=40, chunks_per_page=2):
+        self.seed = seed
+        self.pool = load_sentence_pool(text_dir)
+        if not self.pool:
+            raise FileNotFoundError(f"No extracted texts found in {PAGE_STORE_DIR} or {text_dir}")
+        self.pages_per_doc = pages_per_doc
+        self.chunks_per_page = chunks_per_page
+
+    def _text(self, rng, words):
+        parts = []
+        count = 0
+        while count < words:
+            start = rng.randrange(len(self.pool))
+            for sentence in self.pool[start:start + rng.randint(2, 6)]:
+                parts.append(_perturb(sentence, rng))
+                count += len(sentence.split())
+        return " ".join(parts)
+
+    def pages(self, num_chunks):
+        """Yields (doc, page_number, text) for a corpus of about `num_chunks` chunks."""
+        rng = random.Random(self.seed)
+        num_pages = max(1, num_chunks // self.chunks_per_page)
+        for p in range(num_pages):
+            doc = f"synthetic_policy_{p // self.pages_per_doc + 1}.pdf"
+            yield doc, p % self.pages_per_doc + 1, self._text(rng, WORDS_PER_CHUNK * self.chunks_per_page)
+
+    def chunks(self, num_chunks):
+        """Yields ready-made chunk metadata dicts (skipping the chunker) for retrieval-stage benchmarks."""
+        rng = random.Random(self.seed + 1)
+        for i in range(num_chunks):
+            page = i // self.chunks_per_page
+            text = self._text(rng, WORDS_PER_CHUNK)
+            yield {
+                "doc": f"synthetic_policy_{page // self.pages_per_doc + 1}.pdf",
+                "page": page % self.pages_per_doc + 1,
+                "chunk_index": i % self.chunks_per_page,
+                "text": text,
+                "token_count": len(text.split()),
+            }
+
+    def queries(self, count):
+        """Coverage-style questions built from clause sentences."""
+        rng = random.Random(self.seed + 2)
+        queries = []
+        for _ in range(count):
+            words = [w for w in rng.choice(self.pool).split() if w.isalpha() and len(w) > 3][:6]
+            queries.append(f"Does the policy cover {' '.join(words).lower()}?")
+        return queries
+
+
+if __name__ == "__main__":
+    corpus = SyntheticCorpus()
+    print(f"📄 Sentence pool: {len(corpus.pool)} sentences")
+    for doc, page, text in corpus.pages(4):
+        print(f"\n--- {doc} page {page} ---\n{text[:400]}...")
+    print("\n❓ Sample queries:", corpus.queries(3))
@@ -2,12 +2,30 @@
 
 import sys
 import os
+import argparse
 
 # Add subfolders to path
 sys.path.append(os.path.join(os.path.dirname(__file__), 'scripts'))
 sys.path.append(os.path.join(os.path.dirname(__file__), 'utils'))
 
-from query_and_respond import run_query
+from query_and_respond import run_query, QUERY_DEADLINE_S
+from compare_policies import run_comparison, format_coverage_table
 
 if __name__ == "__main__":
-    run_query()
+    parser = argparse.ArgumentParser(description="Ask a question about the indexed policies")
+    parser.add_argument("--adaptive", action="store_true", help="Adaptive retrieval depth instead of a fixed top 10")
+    parser.add_argument("--compress", action="store_true", help="Compress the context to query-relevant sentences")
+    parser.add_argument("--tenant", help="Query this client's policy library instead of the default store")
+    parser.add_argument("--compare", action="store_true", help="Answer the question for every policy and print a coverage table")
+    parser.add_argument("--deadline", type=float, default=QUERY_DEADLINE_S,
+                        help="Overall time budget per question in seconds (stages degrade as it runs short)")
+    args = parser.parse_args()
+
+    if args.compare:
+        query = input("Enter your query: ")
+        stats = {}
+        rows = run_comparison(query, tenant=args.tenant, deadline_s=args.deadline, stats=stats)
+        print("\n" + format_coverage_table(rows))
+        print(f"⏱️ {stats['deadline']['elapsed_s']:.1f}s for {len(rows)} policies")
+    else:
+        run_query(adaptive=args.adaptive, compress=args.compress, tenant=args.tenant, deadline_s=args.deadline)
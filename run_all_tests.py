@@ -1,14 +1,20 @@
 import json
 import subprocess
 import os
+import re
+import argparse
 from prettytable import PrettyTable
 
 # Path to your test cases file
 TEST_FILE = "test_cases.json"
 QUERY_SCRIPT = "scripts/query_and_respond.py"
 
-def run_query(query):
-    """Runs the query_and_respond.py script and captures its JSON output."""
+def run_query(query, extra_args=None, stats=None):
+    """Runs the query_and_respond.py script and captures its JSON output.
+
+    extra_args are passed on to main.py (e.g. ["--compress"]); if `stats` is a dict, the
+    compression line printed by main.py is parsed into it.
+    """
     try:
         # Create a temporary input file for the query
         with open("temp_query.txt", "w") as f:
@@ -16,7 +22,7 @@ def run_query(query):
         
         # Run the script with input redirection
         result = subprocess.run(
-            ["python", "main.py"],
+            ["python", "main.py"] + (extra_args or []),
             input=query + "\n",
             capture_output=True,
             text=True,
@@ -24,6 +30,15 @@ def run_query(query):
         )
         
         output = result.stdout.strip()
+
+        compression = re.search(r"Compressed context: (\d+) → (\d+) tokens", output)
+        if compression and stats is not None:
+            stats["original_tokens"] = int(compression.group(1))
+            stats["compressed_tokens"] = int(compression.group(2))
+
+        # The final answer is printed after this marker; earlier output holds the raw API response
+        if "LLM Response:" in output:
+            output = output.split("LLM Response:")[-1]
         
         # Look for JSON in the output
         json_start = output.find("{")
@@ -61,29 +76,69 @@ def compare(expected, actual):
         return False
     return actual.get("answer") == expected.get("answer")
 
-def main():
-    # Load test cases
-    with open(TEST_FILE, "r") as f:
-        test_cases = json.load(f)
-
-    table = PrettyTable(["Query", "Expected", "Got", "Result"])
+def run_suite(test_cases, extra_args=None, label=""):
+    """Runs every test case; returns (passed, rows, compression stats per query)."""
+    rows = []
     passed = 0
     total = len(test_cases)
+    token_stats = []
 
     for i, case in enumerate(test_cases):
         query = case["query"]
         expected = case["expected"]
 
-        print(f"\n🚀 Testing ({i+1}/{total}): {query}")
-        actual = run_query(query)
+        print(f"\n🚀 Testing{label} ({i+1}/{total}): {query}")
+        stats = {}
+        actual = run_query(query, extra_args, stats)
+        if stats:
+            token_stats.append(stats)
 
         got_ans = actual.get("answer") if actual else "ERROR"
-        result = "✅ PASS" if compare(expected, actual) else "❌ FAIL"
-        
-        if compare(expected, actual):
+        ok = compare(expected, actual)
+        if ok:
             passed += 1
 
-        table.add_row([query[:40] + "...", expected["answer"], got_ans, result])
+        rows.append((query, expected["answer"], got_ans, ok))
+    return passed, rows, token_stats
+
+def main():
+    parser = argparse.ArgumentParser(description="Run test_cases.json through main.py")
+    parser.add_argument("--adaptive", action="store_true", help="Use adaptive retrieval depth")
+    parser.add_argument("--compress", action="store_true", help="Compress the context before the LLM call")
+    parser.add_argument("--compare-compression", action="store_true",
+                        help="Run the suite with and without compression and compare accuracy")
+    args = parser.parse_args()
+
+    # Load test cases
+    with open(TEST_FILE, "r") as f:
+        test_cases = json.load(f)
+    total = len(test_cases)
+
+    base_args = ["--adaptive"] if args.adaptive else []
+
+    if args.compare_compression:
+        passed_full, rows_full, _ = run_suite(test_cases, base_args, label=" [full]")
+        passed_comp, rows_comp, token_stats = run_suite(test_cases, base_args + ["--compress"], label=" [compressed]")
+
+        table = PrettyTable(["Query", "Expected", "Full", "Compressed"])
+        for (query, expected, got_full, _), (_, _, got_comp, _) in zip(rows_full, rows_comp):
+            table.add_row([query[:40] + "...", expected, got_full, got_comp])
+        print("\n" + table.get_string())
+
+        print(f"\n📊 Full context:       {passed_full}/{total} tests passed ({passed_full/total*100:.1f}%)")
+        print(f"📊 Compressed context: {passed_comp}/{total} tests passed ({passed_comp/total*100:.1f}%)")
+        if token_stats:
+            original = sum(s["original_tokens"] for s in token_stats)
+            compressed = sum(s["compressed_tokens"] for s in token_stats)
+            print(f"✂️ Context tokens: {original} → {compressed} ({1 - compressed / max(original, 1):.1%} saved)")
+        return
+
+    extra_args = base_args + (["--compress"] if args.compress else [])
+    passed, rows, _ = run_suite(test_cases, extra_args)
+
+    table = PrettyTable(["Query", "Expected", "Got", "Result"])
+    for query, expected, got_ans, ok in rows:
+        table.add_row([query[:40] + "...", expected, got_ans, "✅ PASS" if ok else "❌ FAIL"])
 
     print("\n" + table.get_string())
     print(f"\n📊 Results: {passed}/{total} tests passed ({passed/total*100:.1f}%)")
@@ -0,0 +1,130 @@
+import os
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from dotenv import load_dotenv
+
+from models import get_embedder, load_query_models
+from rerank import score_candidates
+from retrieval import retrieve_chunks_per_doc, build_context
+from ask_llm import fallback_response
+from deadline import Deadline, DeadlineExceeded
+from tenants import acquire_store, preload_store
+from query_log import log_query
+from query_and_respond import ask_llm_with_temperature, QUERY_DEADLINE_S, RERANK_RESERVE_S
+
+COMPARE_CANDIDATES_PER_POLICY = 8  # Chunks per policy taken from the shared search
+COMPARE_CHUNKS_PER_POLICY = 4      # Chunks per policy sent to its LLM call after re-ranking
+COMPARE_MAX_PARALLEL = 8           # Concurrent per-policy LLM calls
+
+
+def retrieve_comparison_context(snapshot, query, deadline=None, docs=None):
+    """Shared retrieval for a comparison: one embedding, one doc-partitioned search and one batched
+    cross-encoder call over every policy's candidates. Returns ({doc: context chunks}, stats)."""
+    deadline = deadline or Deadline()
+    with deadline.stage("embed"):
+        query_embedding = get_embedder().encode([query])[0]
+    with deadline.stage("search"):
+        candidates = retrieve_chunks_per_doc(snapshot.shards or snapshot.index, snapshot.metadata, query_embedding,
+                                             COMPARE_CANDIDATES_PER_POLICY, docs=docs)
+
+    stats = {"mode": "compare", "policies": len(candidates),
+             "retrieved": sum(len(chunks) for chunks in candidates.values()),
+             "retrieved_ids": [chunk["id"] for chunks in candidates.values() for chunk in chunks]}
+    if deadline.remaining() < RERANK_RESERVE_S:
+        deadline.degrade("Skipped re-ranking, using FAISS order per policy")
+        stats["rerank"] = {"cross_encoder_scored": 0, "cache_hits": 0}
+        context = {doc: chunks[:COMPARE_CHUNKS_PER_POLICY] for doc, chunks in candidates.items()}
+        stats["context_chunks"] = sum(len(chunks) for chunks in context.values())
+        return context, stats
+
+    start = time.perf_counter()
+    all_chunks = [chunk for chunks in candidates.values() for chunk in chunks]
+    try:
+        with deadline.stage("rerank"):
+            predicted, hits = score_candidates(query, all_chunks, cache_namespace=snapshot.path)
+        context = {doc: sorted(chunks, key=lambda c: c["rerank_score"], reverse=True)[:COMPARE_CHUNKS_PER_POLICY]
+                   for doc, chunks in candidates.items()}
+    except DeadlineExceeded:
+        raise
+    except Exception as e:
+        # If the cross-encoder fails, continue with the FAISS ranking
+        print(f"⚠️ Cross-encoder re-ranking failed: {e}")
+        context = {doc: chunks[:COMPARE_CHUNKS_PER_POLICY] for doc, chunks in candidates.items()}
+        predicted, hits = 0, 0
+    stats["rerank"] = {"cross_encoder_scored": predicted, "cache_hits": hits,
+                       "rerank_ms": (time.perf_counter() - start) * 1000}
+    stats["context_chunks"] = sum(len(chunks) for chunks in context.values())
+    return context, stats
+
+
+def _coverage_row(doc, chunks, response):
+    result = json.loads(response)
+    return {
+        "doc": doc,
+        "answer": result.get("answer", "UNKNOWN"),
+        "confidence": result.get("confidence", 0.0),
+        "source_clause": result.get("source_clause"),
+        "justification": result.get("justification", ""),
+        "pages": sorted({chunk["page"] for chunk in chunks}),
+        "sections": list(dict.fromkeys(chunk["section"] for chunk in chunks if chunk.get("section"))),
+    }
+
+
+def run_comparison(query, temperature=0.1, tenant=None, deadline_s=QUERY_DEADLINE_S, stats=None, docs=None):
+    """Answers one question for every indexed policy. Returns coverage rows, one per policy.
+
+    Retrieval is shared (see retrieve_comparison_context); the per-policy LLM calls, each seeing only
+    that policy's chunks, run concurrently under the same deadline, so the whole comparison costs
+    about one question's latency. Rows carry the answer, confidence, source clause and the pages and
+    sections of the chunks it was based on.
+    """
+    load_dotenv()
+    if not os.getenv("TOGETHER_API_KEY"):
+        raise EnvironmentError("❌ TOGETHER_API_KEY not found in environment variables.")
+
+    load_query_models()  # Outside the budget, like run_query_with_context
+    preload_store(tenant)
+    deadline = Deadline(deadline_s)
+    stats = stats if stats is not None else {}
+    context, store_version = {}, None
+    try:
+        with acquire_store(tenant) as snapshot:
+            store_version = snapshot.version
+            context, retrieval_stats = retrieve_comparison_context(snapshot, query, deadline, docs=docs)
+        stats.update(retrieval_stats)
+
+        # Each call gets its own view of the shared budget so concurrent calls don't add up their time
+        with deadline.stage("llm"):
+            with ThreadPoolExecutor(max_workers=min(COMPARE_MAX_PARALLEL, max(1, len(context)))) as pool:
+                futures = {
+                    doc: pool.submit(ask_llm_with_temperature, query, build_context(chunks), temperature,
+                                     Deadline(deadline.remaining()))
+                    for doc, chunks in context.items() if chunks
+                }
+                responses = {doc: future.result() for doc, future in futures.items()}
+    except DeadlineExceeded as e:
+        print(f"⏳ {e}")
+        responses = {}
+        fallback = fallback_response(str(e))
+    else:
+        fallback = fallback_response("No relevant clauses found in this policy.")
+
+    rows = [_coverage_row(doc, chunks, responses.get(doc, fallback)) for doc, chunks in sorted(context.items())]
+    stats["deadline"] = deadline.report()
+    params = {"temperature": temperature, "tenant": tenant, "deadline_s": deadline_s, "docs": docs}
+    log_query(query, "compare", params, stats,
+              chunk_ids=[chunk["id"] for chunks in context.values() for chunk in chunks],
+              store_version=store_version)
+    return rows
+
+
+def format_coverage_table(rows):
+    """Plain-text coverage table for the CLI."""
+    lines = [f"{'Policy':<16} {'Answer':<8} {'Conf.':>6}  {'Pages':<14} Source clause"]
+    for row in rows:
+        pages = ", ".join(str(p) for p in row["pages"][:5])
+        clause = row["source_clause"] or (row["sections"][0] if row["sections"] else "-")
+        lines.append(f"{row['doc']:<16} {row['answer']:<8} {row['confidence']:>6.0%}  {pages:<14} {clause}")
+    return "\n".join(lines)
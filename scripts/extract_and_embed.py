@@ -1,199 +1,147 @@
 import os
-import fitz  # PyMuPDF
+import sys
+import argparse
 from sentence_transformers import SentenceTransformer
 import numpy as np
 import faiss
-import pickle
-import re
 from transformers import AutoTokenizer
 
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'utils'))
+
+from chunking import improved_semantic_chunk_pdf_text
+from extraction import extract_with_cache
+from sections import build_sections, build_section_index
+from shards import SHARD_FILE, SHARD_STRATEGIES, assign_shards, build_shard_indexes
+from vector_store import publish_vector_store
+from tenants import tenant_store_dir
+from warmup import WARMUP_QUERIES
+
 # === Folder paths ===
 DATA_DIR = "../data/"
-OUTPUT_TEXT_DIR = "../outputs/extracted_texts/"
+PAGE_STORE_DIR = "../outputs/page_store/"
 VECTOR_STORE_DIR = "../outputs/vector_store/"
 
-os.makedirs(OUTPUT_TEXT_DIR, exist_ok=True)
-os.makedirs(VECTOR_STORE_DIR, exist_ok=True)
+# === Chunking defaults ===
+MIN_TOKENS = 150     # Increased from 100
+MAX_TOKENS = 300     # Reduced from 480 for more precise chunks
+OVERLAP_TOKENS = 50  # Increased from 20 for better context
 
 # === Step 1: Extract text from each PDF ===
-def extract_text_from_pdf(pdf_path):
-    doc = fitz.open(pdf_path)
-    texts = []
-    for page_num, page in enumerate(doc, start=1):
-        page_text = page.get_text()
-        # Clean up the text
-        page_text = re.sub(r'\s+', ' ', page_text)  # Normalize whitespace
-        page_text = page_text.strip()
-        if page_text:  # Only add non-empty pages
-            texts.append((page_text, page_num))
-    return texts  # List of (text, page_number)
-
-print("📄 Extracting text from PDFs...")
-
-all_texts = {}
-for filename in os.listdir(DATA_DIR):
-    if filename.endswith(".pdf"):
-        pdf_path = os.path.join(DATA_DIR, filename)
-        page_texts = extract_text_from_pdf(pdf_path)
-        
-        txt_file = os.path.join(OUTPUT_TEXT_DIR, filename.replace(".pdf", ".txt"))
-        with open(txt_file, "w", encoding="utf-8") as f:
-            for page_text, page_num in page_texts:
-                f.write(f"\n--- Page {page_num} ---\n")
-                f.write(page_text)
-        print(f"✅ Saved text from {filename}")
-        
-        all_texts[filename] = page_texts  # Store list of (text, page_number)
+def extract_all_texts(data_dir=DATA_DIR, page_store_dir=PAGE_STORE_DIR):
+    """Extracts every PDF in data_dir through the page store (unchanged PDFs aren't parsed again).
+
+    Returns ({filename: [(text, page_number), ...]}, {filename: page store key}).
+    """
+    print("📄 Extracting text from PDFs...")
+    all_texts = {}
+    page_keys = {}
+    for filename in sorted(os.listdir(data_dir)):
+        if filename.endswith(".pdf"):
+            key, page_texts, cached = extract_with_cache(os.path.join(data_dir, filename), page_store_dir)
+            print(f"✅ {'Loaded stored' if cached else 'Extracted'} text of {filename} ({len(page_texts)} pages)")
+
+            all_texts[filename] = page_texts  # Store list of (text, page_number)
+            page_keys[filename] = key
+    return all_texts, page_keys
 
 # === Step 2: Improved Semantic chunking ===
-def find_semantic_boundaries(text):
-    """Find natural boundaries like section headers, clause numbers, etc."""
-    # Common legal document patterns
-    patterns = [
-        r'\b(?:SECTION|Section|section)\s+[A-Z]?[0-9]*[\.\)]?\s*[A-Z]',  # Section headers
-        r'\b(?:CLAUSE|Clause|clause)\s+[0-9]+[\.\)]?\s*[A-Z]',  # Clause headers
-        r'\b(?:DEFINITION|Definition|definition)\s+[0-9]+[\.\)]?\s*[A-Z]',  # Definition headers
-        r'\b(?:EXCLUSION|Exclusion|exclusion)\s+[0-9]+[\.\)]?\s*[A-Z]',  # Exclusion headers
-        r'\b[A-Z][A-Z\s]{3,}:\s*[A-Z]',  # All caps headers
-        r'\b[0-9]+[\.\)]\s*[A-Z][a-z]',  # Numbered items
-    ]
-    
-    boundaries = []
-    for pattern in patterns:
-        matches = re.finditer(pattern, text)
-        for match in matches:
-            boundaries.append(match.start())
-    
-    return sorted(boundaries)
-
-def improved_semantic_chunk_pdf_text(text, filename, page_number=None, min_tokens=150, max_tokens=300, overlap_tokens=50, tokenizer=None):
-    """Improved chunking with semantic boundaries and better text processing."""
-    if tokenizer is None:
-        tokenizer = AutoTokenizer.from_pretrained("sentence-transformers/all-MiniLM-L6-v2")
-
-    # Clean and normalize text
-    text = re.sub(r'\s+', ' ', text.strip())
-    
-    # Find semantic boundaries
-    boundaries = find_semantic_boundaries(text)
-    
-    # Split into sentences
-    sentences = re.split(r'(?<=[.!?])\s+', text)
-    sentences = [s.strip() for s in sentences if s.strip()]
-    
-    chunks = []
-    meta = []
-    current_chunk = []
-    current_tokens = 0
-    chunk_index = 0
-    i = 0
-    
-    while i < len(sentences):
-        sentence = sentences[i]
-        sentence_tokens = len(tokenizer.tokenize(sentence))
-
-        # Handle very long sentences
-        if sentence_tokens > max_tokens:
-            print(f"✂️ Truncating long sentence on page {page_number} of {filename}")
-            tokens = tokenizer.tokenize(sentence)[:max_tokens]
-            sentence = tokenizer.convert_tokens_to_string(tokens)
-            sentence_tokens = len(tokens)
-
-        # Check if adding this sentence would exceed max_tokens
-        if current_tokens + sentence_tokens <= max_tokens:
-            current_chunk.append(sentence)
-            current_tokens += sentence_tokens
-            i += 1
-        else:
-            # If we have enough content, create a chunk
-            if current_tokens >= min_tokens:
-                chunk_text = " ".join(current_chunk).strip()
-                chunks.append(chunk_text)
-                meta.append({
-                    "doc": filename,
-                    "page": page_number,
-                    "chunk_index": chunk_index,
-                    "text": chunk_text,
-                    "token_count": current_tokens
-                })
-                chunk_index += 1
-
-                # Create overlap: keep last sentences that fit within overlap_tokens
-                overlap = []
-                overlap_tokens_used = 0
-                for sent in reversed(current_chunk):
-                    sent_tokens = len(tokenizer.tokenize(sent))
-                    if overlap_tokens_used + sent_tokens <= overlap_tokens:
-                        overlap.insert(0, sent)
-                        overlap_tokens_used += sent_tokens
-                    else:
-                        break
-                
-                current_chunk = overlap
-                current_tokens = overlap_tokens_used
-            else:
-                # Force add the sentence if we're below min_tokens
-                current_chunk.append(sentence)
-                current_tokens += sentence_tokens
-                i += 1
-
-    # Add final chunk
-    if current_chunk:
-        chunk_text = " ".join(current_chunk).strip()
-        chunks.append(chunk_text)
-        meta.append({
-            "doc": filename,
-            "page": page_number,
-            "chunk_index": chunk_index,
-            "text": chunk_text,
-            "token_count": current_tokens
-        })
-
-    return chunks, meta
-
-print("\n✂️ Improved chunking and embedding text...")
-
-# Use a better sentence transformer model
-model = SentenceTransformer("all-mpnet-base-v2")  # Better than all-MiniLM-L6-v2
-tokenizer = AutoTokenizer.from_pretrained("sentence-transformers/all-mpnet-base-v2")
-all_chunks = []
-chunk_meta = []
-
-for doc_name, page_texts in all_texts.items():
-    print(f"📄 Processing {doc_name}...")
-    for page_text, page_num in page_texts:
-        chunks, meta = improved_semantic_chunk_pdf_text(
-            page_text,
-            filename=doc_name,
-            page_number=page_num,
-            min_tokens=150,    # Increased from 100
-            max_tokens=300,    # Reduced from 480 for more precise chunks
-            overlap_tokens=50,  # Increased from 20 for better context
-            tokenizer=tokenizer
-        )
-        all_chunks.extend(chunks)
-        chunk_meta.extend(meta)
-
-print(f"🔹 Total chunks: {len(all_chunks)}")
-print(f"🔹 Average chunk length: {np.mean([len(chunk.split()) for chunk in all_chunks]):.1f} words")
-
-# === Step 3: Create embeddings ===
-print("🔍 Creating embeddings...")
-embeddings = model.encode(all_chunks, show_progress_bar=True)
-
-# === Step 4: Store in FAISS index ===
-dimension = embeddings[0].shape[0]
-index = faiss.IndexFlatL2(dimension)
-index.add(np.array(embeddings))
-
-# Save index and metadata
-faiss.write_index(index, os.path.join(VECTOR_STORE_DIR, "index.faiss"))
-
-with open(os.path.join(VECTOR_STORE_DIR, "chunks.pkl"), "wb") as f:
-    pickle.dump(all_chunks, f)
-
-with open(os.path.join(VECTOR_STORE_DIR, "meta.pkl"), "wb") as f:
-    pickle.dump(chunk_meta, f)
-
-print("✅ Improved embeddings and metadata saved!")
-print(f"📊 Index contains {len(all_chunks)} chunks with {dimension}-dimensional embeddings")
+def chunk_all_texts(all_texts, tokenizer, min_tokens=MIN_TOKENS, max_tokens=MAX_TOKENS, overlap_tokens=OVERLAP_TOKENS):
+    """Chunks every page of every document. Returns (all_chunks, chunk_meta)."""
+    all_chunks = []
+    chunk_meta = []
+
+    for doc_name, page_texts in all_texts.items():
+        print(f"📄 Processing {doc_name}...")
+        for page_text, page_num in page_texts:
+            chunks, meta = improved_semantic_chunk_pdf_text(
+                page_text,
+                filename=doc_name,
+                page_number=page_num,
+                min_tokens=min_tokens,
+                max_tokens=max_tokens,
+                overlap_tokens=overlap_tokens,
+                tokenizer=tokenizer
+            )
+            all_chunks.extend(chunks)
+            chunk_meta.extend(meta)
+    return all_chunks, chunk_meta
+
+def build_index(embeddings):
+    """Builds the FAISS index over chunk embeddings."""
+    dimension = embeddings[0].shape[0]
+    index = faiss.IndexFlatL2(dimension)
+    index.add(np.array(embeddings))
+    return index
+
+def embed_and_publish(all_texts, all_chunks, chunk_meta, store_dir, manifest_extra, shards=0, shard_by="doc"):
+    """Embeds the chunks, builds the chunk/section (and shard) indexes and publishes them as a new version."""
+    print(f"🔹 Total chunks: {len(all_chunks)}")
+    print(f"🔹 Average chunk length: {np.mean([len(chunk.split()) for chunk in all_chunks]):.1f} words")
+
+    # === Step 3: Create embeddings ===
+    print("🔍 Creating embeddings...")
+    model = SentenceTransformer("all-mpnet-base-v2")  # Better than all-MiniLM-L6-v2
+    embeddings = model.encode(all_chunks, show_progress_bar=True)
+
+    # === Step 4: Store in FAISS index ===
+    index = build_index(embeddings)
+
+    # === Step 5: Section tree + section-level index for coarse-to-fine retrieval ===
+    sections, trees = build_sections(all_texts, chunk_meta)
+    section_index = build_section_index(sections, embeddings)
+    print(f"🗂️ {len(sections)} sections across {len(trees)} documents")
+    artifacts = {"sections.faiss": section_index, "sections.pkl": {"sections": sections, "trees": trees}}
+    manifest_extra = dict(manifest_extra, embedding_model="all-mpnet-base-v2", documents=sorted(all_texts),
+                          num_sections=len(sections))
+
+    # === Step 6 (optional): shard indexes for scatter-gather search ===
+    if shards > 1:
+        assignments = assign_shards(chunk_meta, shards, by=shard_by)
+        for i, shard_index in enumerate(build_shard_indexes(embeddings, assignments)):
+            artifacts[SHARD_FILE.format(i)] = shard_index
+        manifest_extra.update(shards=shards, shard_by=shard_by, shard_sizes=[len(ids) for ids in assignments])
+        print(f"🧩 {shards} shards by {shard_by}: {[len(ids) for ids in assignments]} chunks")
+
+    # Publish index and metadata as a new version; readers switch over atomically
+    version = publish_vector_store(
+        index, all_chunks, chunk_meta,
+        store_dir=store_dir,
+        manifest_extra=manifest_extra,
+        artifacts=artifacts
+    )
+
+    print(f"✅ Improved embeddings and metadata saved as version {version}!")
+    print(f"📊 Index contains {len(all_chunks)} chunks with {index.d}-dimensional embeddings")
+    return version
+
+def main():
+    parser = argparse.ArgumentParser(description="Extract, chunk and embed policy PDFs into a new store version")
+    parser.add_argument("--tenant", help="Build this client's store (outputs/vector_store/tenants/<tenant>)")
+    parser.add_argument("--data-dir", default=DATA_DIR, help="Folder with the policy PDFs")
+    parser.add_argument("--shards", type=int, default=0, help="Split the index into N shards served by worker processes")
+    parser.add_argument("--shard-by", choices=SHARD_STRATEGIES, default="doc", help="Shard by document or by chunk hash")
+    parser.add_argument("--warm-up", type=int, default=WARMUP_QUERIES,
+                        help="Precompute retrieval for the N most frequent queries of the new version (0 = skip)")
+    args = parser.parse_args()
+
+    store_dir = tenant_store_dir(args.tenant, VECTOR_STORE_DIR) if args.tenant else VECTOR_STORE_DIR
+    all_texts, page_keys = extract_all_texts(args.data_dir)
+
+    print("\n✂️ Improved chunking and embedding text...")
+    tokenizer = AutoTokenizer.from_pretrained("sentence-transformers/all-mpnet-base-v2")
+    all_chunks, chunk_meta = chunk_all_texts(all_texts, tokenizer)
+
+    manifest_extra = {
+        "page_store": page_keys,
+        "chunking": {"min_tokens": MIN_TOKENS, "max_tokens": MAX_TOKENS, "overlap_tokens": OVERLAP_TOKENS},
+    }
+    embed_and_publish(all_texts, all_chunks, chunk_meta, store_dir, manifest_extra,
+                      shards=args.shards, shard_by=args.shard_by)
+
+    # === Step 7: precompute retrieval for hot queries of the new version ===
+    if args.warm_up > 0:
+        from warm_up import warm_up_store
+        warm_up_store(store_dir, args.warm_up, tenant=args.tenant)
+
+if __name__ == "__main__":
+    main()
@@ -1,216 +1,260 @@
-import requests
-import json
-from sentence_transformers import SentenceTransformer, CrossEncoder
-import faiss
-import pickle
 from dotenv import load_dotenv
 import os
-import numpy as np
-from ask_llm import ask_llm
+import time
+from ask_llm import ask_llm, fallback_response, LLM_MIN_TIMEOUT_S
+from models import get_embedder, load_query_models
+from rerank import cascade_rerank, score_candidates, find_relevance_cliff
+from compress import compress_chunks
+from retrieval import search_snapshot, build_context
+from vector_store import load_current_snapshot
+from tenants import acquire_store, preload_store, tenant_store_dir
+from deadline import Deadline, DeadlineExceeded
+from query_log import log_query
 
 
 load_dotenv()
 TOGETHER_API_KEY = os.getenv("TOGETHER_API_KEY")
 
-def run_query():
+CONTEXT_CHUNKS = 10  # Chunks sent to the LLM after re-ranking
+
+# Adaptive retrieval depth
+ADAPTIVE_INITIAL_K = 8       # Candidates fetched before deciding whether to look deeper
+ADAPTIVE_FLAT_SPREAD = 0.08  # L2 distance spread (best vs. k-th) below which the ranking counts as flat
+ADAPTIVE_MIN_CONTEXT = 2     # Never send fewer chunks than this
+ADAPTIVE_CLIFF_DROP = 2.5    # Cross-encoder score drop that marks a relevance cliff
+
+# Deadlines
+QUERY_DEADLINE_S = 45.0      # Overall budget of one question, from embedding to the LLM's answer
+RERANK_RESERVE_S = 12.0      # Skip re-ranking/compression when less than this is left for them and the LLM
+SHORT_CONTEXT_CHUNKS = 5     # Context size once re-ranking had to be skipped
+
+def retrieve_context(snapshot, query, num_chunks=15, adaptive=False, compress=False, deadline=None,
+                     query_embedding=None, use_warm=True):
+    """Embeds, searches and re-ranks. Returns (context chunks, retrieval stats).
+
+    The stats include the ids of every chunk the search returned ("retrieved_ids"), before
+    re-ranking, the adaptive cut and compression narrow them down to the context.
+
+    Hot queries precomputed for this store version by the warm-up job (scripts/warm_up.py) are
+    answered from the snapshot's warm table without embedding, search or re-ranking; other queries
+    still reuse a precomputed embedding of the same question if there is one. Pass use_warm=False
+    to always compute, and query_embedding to skip the embed stage.
+
+    Fixed mode retrieves num_chunks candidates and keeps the top 10 after re-ranking.
+    Adaptive mode starts from ADAPTIVE_INITIAL_K candidates, widens to num_chunks only when their
+    distances are flat, and cuts the context at a relevance cliff in the cross-encoder scores.
+    With compress=True the chunks are then reduced to their query-relevant sentences.
+    With a Deadline, re-ranking and compression are skipped (and the context shortened to
+    SHORT_CONTEXT_CHUNKS in FAISS order) when less than RERANK_RESERVE_S is left; DeadlineExceeded
+    is raised if the budget runs out before a stage.
+    """
+    deadline = deadline or Deadline()
+    warm = snapshot.warm if use_warm else None
+    if warm is not None:
+        with deadline.stage("warm"):
+            hit = warm.get(query, num_chunks, adaptive, compress)
+            if query_embedding is None:
+                query_embedding = warm.embedding(query)
+        if hit is not None:
+            # Nothing was searched or re-ranked for this query; the warm-up run's rerank stats don't apply
+            context_chunks, stats = hit
+            stats.update(mode="warm", warm_up_mode=stats.get("mode"))
+            stats["rerank"] = {"candidates": 0, "cross_encoder_scored": 0, "cache_hits": 0, "rerank_ms": 0.0}
+            return context_chunks, stats
+
+    if query_embedding is None:
+        with deadline.stage("embed"):
+            query_embedding = get_embedder().encode([query])[0]
+    stats = {"mode": "adaptive" if adaptive else "fixed"}
+
+    if deadline.remaining() < RERANK_RESERVE_S:
+        with deadline.stage("search"):
+            retrieved = search_snapshot(snapshot, query_embedding, SHORT_CONTEXT_CHUNKS)
+        deadline.degrade(f"Skipped re-ranking, using the top {SHORT_CONTEXT_CHUNKS} FAISS results")
+        stats.update(mode="degraded", retrieved=len(retrieved), context_chunks=len(retrieved),
+                     retrieved_ids=[c["id"] for c in retrieved])
+        stats["rerank"] = {"candidates": len(retrieved), "cross_encoder_scored": 0, "cache_hits": 0, "rerank_ms": 0.0}
+        return retrieved, stats
+
+    if not adaptive:
+        with deadline.stage("search"):
+            retrieved = search_snapshot(snapshot, query_embedding, num_chunks)
+
+        # Re-rank: cheap first pass, cross-encoder only for candidates near the top-10 cut
+        with deadline.stage("rerank"):
+            ranked, stats["rerank"] = cascade_rerank(
+                query, retrieved, top_n=CONTEXT_CHUNKS, cache_namespace=snapshot.path
+            )
+        context_chunks = ranked[:CONTEXT_CHUNKS]  # Use top 10 after re-ranking
+    else:
+        top_k = min(ADAPTIVE_INITIAL_K, num_chunks)
+        with deadline.stage("search"):
+            retrieved = search_snapshot(snapshot, query_embedding, top_k)
+
+            # A flat distance profile means FAISS can't tell the candidates apart: look deeper
+            spread = retrieved[-1]["distance"] - retrieved[0]["distance"] if retrieved else 0.0
+            stats["distance_spread"] = spread
+            stats["widened"] = spread < ADAPTIVE_FLAT_SPREAD and num_chunks > top_k
+            if stats["widened"]:
+                retrieved = search_snapshot(snapshot, query_embedding, num_chunks)
+
+        start = time.perf_counter()
+        try:
+            with deadline.stage("rerank"):
+                predicted, hits = score_candidates(query, retrieved, cache_namespace=snapshot.path)
+            ranked = sorted(retrieved, key=lambda c: c["rerank_score"], reverse=True)
+            keep = find_relevance_cliff(
+                [c["rerank_score"] for c in ranked],
+                min_keep=ADAPTIVE_MIN_CONTEXT, max_keep=CONTEXT_CHUNKS, min_drop=ADAPTIVE_CLIFF_DROP
+            )
+        except DeadlineExceeded:
+            raise
+        except Exception as e:
+            # If the cross-encoder fails, continue with the FAISS ranking
+            print(f"⚠️ Cross-encoder re-ranking failed: {e}")
+            ranked, keep, predicted, hits = retrieved, CONTEXT_CHUNKS, 0, 0
+        stats["rerank"] = {
+            "candidates": len(retrieved),
+            "cross_encoder_scored": predicted,
+            "cache_hits": hits,
+            "rerank_ms": (time.perf_counter() - start) * 1000,
+        }
+        context_chunks = ranked[:keep]
+
+    if compress and deadline.remaining() < RERANK_RESERVE_S:
+        deadline.degrade("Skipped context compression")
+    elif compress:
+        with deadline.stage("compress"):
+            context_chunks, stats["compression"] = compress_chunks(query, context_chunks)
+
+    stats["retrieved"] = len(retrieved)
+    stats["retrieved_ids"] = [c["id"] for c in retrieved]
+    stats["context_chunks"] = len(context_chunks)
+    return context_chunks, stats
+
+def run_query(adaptive=False, compress=False, tenant=None, deadline_s=QUERY_DEADLINE_S):
     load_dotenv()
     TOGETHER_API_KEY = os.getenv("TOGETHER_API_KEY")
 
-    # Load FAISS index
-    index = faiss.read_index("outputs/vector_store/index.faiss")
+    # Load the current version of the FAISS index and chunk metadata
+    snapshot = load_current_snapshot(tenant_store_dir(tenant)) if tenant else load_current_snapshot()
 
-    # Load chunk metadata
-    with open("outputs/vector_store/meta.pkl", "rb") as f:
-        metadata = pickle.load(f)
+    load_query_models()  # Before the question, so loading doesn't count against its deadline
 
     # Get user query
     query = input("Enter your query: ")
-
-    # Use the same model as in embedding for consistency
-    embedder = SentenceTransformer("all-mpnet-base-v2")
-    query_embedding = embedder.encode([query])[0]
+    deadline = Deadline(deadline_s)  # The budget starts once the question is asked
+    params = {"num_chunks": 15, "temperature": 0.1, "adaptive": adaptive, "compress": compress,
+              "tenant": tenant, "deadline_s": deadline_s}
 
     # Enhanced retrieval with more chunks and re-ranking
     top_k = 15  # Increased from 5 for better coverage
-    _, indices = index.search(np.array([query_embedding]), top_k)
-
-    # Retrieve chunks with metadata
-    retrieved_chunks = []
-    for i in indices[0]:
-        chunk_info = metadata[i]
-        retrieved_chunks.append({
-            'text': chunk_info["text"],
-            'doc': chunk_info["doc"],
-            'page': chunk_info["page"],
-            'chunk_index': chunk_info["chunk_index"],
-            'token_count': chunk_info.get("token_count", 0)
-        })
-
-    # Re-rank chunks using a cross-encoder for better relevance
     try:
-        cross_encoder = CrossEncoder('cross-encoder/ms-marco-MiniLM-L-6-v2')
-        pairs = [[query, chunk['text']] for chunk in retrieved_chunks]
-        scores = cross_encoder.predict(pairs)
-        
-        # Sort chunks by relevance score
-        chunk_scores = list(zip(retrieved_chunks, scores))
-        chunk_scores.sort(key=lambda x: x[1], reverse=True)
-        retrieved_chunks = [chunk for chunk, score in chunk_scores]
-        
-        print(f"🔍 Retrieved {len(retrieved_chunks)} chunks, re-ranked by relevance")
-    except Exception as e:
-        print(f"⚠️ Cross-encoder re-ranking failed: {e}")
-        print("📄 Using original FAISS ranking")
-
-    # Create enhanced context with metadata
-    context_parts = []
-    for i, chunk in enumerate(retrieved_chunks[:10]):  # Use top 10 after re-ranking
-        context_parts.append(f"[Document: {chunk['doc']}, Page: {chunk['page']}]\n{chunk['text']}")
-    
-    context = "\n\n---\n\n".join(context_parts)
+        context_chunks, stats = retrieve_context(snapshot, query, num_chunks=top_k, adaptive=adaptive,
+                                                 compress=compress, deadline=deadline)
+    except DeadlineExceeded as e:
+        print(f"⏳ {e}")
+        response = fallback_response(str(e))
+        print("\nLLM Response:\n")
+        print(response)
+        print(deadline.summary())
+        log_query(query, "cli", params, {"deadline": deadline.report()}, response=response,
+                  store_version=snapshot.version)
+        return
+
+    rerank_stats = stats["rerank"]
+    if stats["mode"] == "warm":
+        print(f"⚡ Precomputed retrieval for this question (store version {snapshot.version}, "
+              f"{stats['warm_up_mode']} depth), no search or re-ranking needed")
+    else:
+        print(f"🔍 Retrieved {stats['retrieved']} chunks ({stats['mode']} depth), re-ranked by relevance "
+              f"({rerank_stats['cross_encoder_scored']} cross-encoder calls, "
+              f"{rerank_stats['cache_hits']} cached, {rerank_stats['rerank_ms']:.0f} ms)")
+
+    if "compression" in stats:
+        compression = stats["compression"]
+        print(f"✂️ Compressed context: {compression['original_tokens']} → {compression['compressed_tokens']} tokens "
+              f"({compression['tokens_saved']} saved, {compression['sentences_kept']}/{compression['sentences_total']} sentences)")
+
+    context = build_context(context_chunks)
 
     print(f"📄 Context length: {len(context)} characters")
-    print(f"📄 Number of chunks in context: {len(context_parts)}")
+    print(f"📄 Number of chunks in context: {len(context_chunks)}")
 
     # Ask LLM
-    response = ask_llm(query, context)
+    response = ask_llm(query, context, deadline=deadline)
 
     print("\nLLM Response:\n")
     print(response)
-
-def run_query_with_context(query, num_chunks=15, temperature=0.1):
-    """Enhanced version for Streamlit frontend with configurable parameters"""
+    print(deadline.summary())
+
+    stats["deadline"] = deadline.report()
+    log_query(query, "cli", params, stats, chunk_ids=[c["id"] for c in context_chunks], response=response,
+              store_version=snapshot.version)
+
+def run_query_with_context(query, num_chunks=15, temperature=0.1, adaptive=False, compress=False, stats=None,
+                           tenant=None, deadline_s=QUERY_DEADLINE_S):
+    """Enhanced version for Streamlit frontend with configurable parameters
+
+    With adaptive=True, num_chunks is the maximum retrieval depth rather than a fixed one;
+    compress=True keeps only the query-relevant sentences of each chunk.
+    tenant selects a client's policy library (loaded on first use); None uses the default store.
+    deadline_s is the overall time budget: stages degrade as it runs short and the UNKNOWN fallback
+    is returned once it is gone.
+    If a `stats` dict is passed it is filled with retrieval statistics and the per-stage time spent
+    ("deadline") for display.
+    """
     load_dotenv()
     TOGETHER_API_KEY = os.getenv("TOGETHER_API_KEY")
 
     if not TOGETHER_API_KEY:
         raise EnvironmentError("❌ TOGETHER_API_KEY not found in environment variables.")
 
-    # Load FAISS index
-    index = faiss.read_index("outputs/vector_store/index.faiss")
-
-    # Load chunk metadata
-    with open("outputs/vector_store/meta.pkl", "rb") as f:
-        metadata = pickle.load(f)
-
-    # Use the same model as in embedding for consistency
-    embedder = SentenceTransformer("all-mpnet-base-v2")
-    query_embedding = embedder.encode([query])[0]
-
-    # Enhanced retrieval with configurable number of chunks
-    _, indices = index.search(np.array([query_embedding]), num_chunks)
-
-    # Retrieve chunks with metadata
-    retrieved_chunks = []
-    for i in indices[0]:
-        chunk_info = metadata[i]
-        retrieved_chunks.append({
-            'text': chunk_info["text"],
-            'doc': chunk_info["doc"],
-            'page': chunk_info["page"],
-            'chunk_index': chunk_info["chunk_index"],
-            'token_count': chunk_info.get("token_count", 0)
-        })
-
-    # Re-rank chunks using a cross-encoder for better relevance
+    load_query_models()  # No-op once loaded; the first query of a process must not pay for it in its budget
+    preload_store(tenant)  # Same for loading a new store version and starting its shard workers
+    deadline = Deadline(deadline_s)
+    stats = stats if stats is not None else {}
+    context_chunks, store_version = [], None
     try:
-        cross_encoder = CrossEncoder('cross-encoder/ms-marco-MiniLM-L-6-v2')
-        pairs = [[query, chunk['text']] for chunk in retrieved_chunks]
-        scores = cross_encoder.predict(pairs)
-        
-        # Sort chunks by relevance score
-        chunk_scores = list(zip(retrieved_chunks, scores))
-        chunk_scores.sort(key=lambda x: x[1], reverse=True)
-        retrieved_chunks = [chunk for chunk, score in chunk_scores]
-        
-    except Exception as e:
-        # If cross-encoder fails, continue with original ranking
-        pass
-
-    # Create enhanced context with metadata
-    context_parts = []
-    for i, chunk in enumerate(retrieved_chunks[:10]):  # Use top 10 after re-ranking
-        context_parts.append(f"[Document: {chunk['doc']}, Page: {chunk['page']}]\n{chunk['text']}")
-    
-    context = "\n\n---\n\n".join(context_parts)
-
-    # Ask LLM with configurable temperature
-    response = ask_llm_with_temperature(query, context, temperature)
-    
+        # Pin the current store version; a concurrent rebuild only affects later queries
+        with acquire_store(tenant) as snapshot:
+            store_version = snapshot.version
+            context_chunks, retrieval_stats = retrieve_context(snapshot, query, num_chunks, adaptive=adaptive,
+                                                               compress=compress, deadline=deadline)
+            context = build_context(context_chunks)
+
+        stats.update(retrieval_stats)
+        stats["context_chars"] = len(context)
+
+        # Ask LLM with configurable temperature
+        response = ask_llm_with_temperature(query, context, temperature, deadline=deadline, stats=stats)
+    except DeadlineExceeded as e:
+        print(f"⏳ {e}")
+        response = fallback_response(str(e))
+
+    stats["deadline"] = deadline.report()
+    params = {"num_chunks": num_chunks, "temperature": temperature, "adaptive": adaptive, "compress": compress,
+              "tenant": tenant, "deadline_s": deadline_s}
+    log_query(query, "app", params, stats, chunk_ids=[c["id"] for c in context_chunks], response=response,
+              store_version=store_version)
     return response
 
-def ask_llm_with_temperature(query, context, temperature=0.1):
-    """Modified ask_llm function that accepts temperature parameter"""
+def ask_llm_with_temperature(query, context, temperature=0.1, deadline=None, stats=None):
+    """ask_llm with a configurable temperature that never raises: errors become a fallback response.
+
+    The completion is streamed through the incremental validator (see ask_llm), so malformed output
+    is cancelled and retried at once; `stats["llm"]` reports attempts and tokens saved.
+    """
     api_key = os.getenv("TOGETHER_API_KEY")
     if not api_key:
         raise EnvironmentError("❌ TOGETHER_API_KEY not found in environment variables.")
 
-    # Load system prompt
-    with open("prompts/system_prompt.txt", "r") as f:
-        system_prompt = f.read()
-
-    # Call the LLM with configurable temperature
-    headers = {
-        "Authorization": f"Bearer {api_key}",
-        "Content-Type": "application/json"
-    }
-
-    user_message = f"""Context:
-{context}
-
-Question: {query}
-
-IMPORTANT: Respond ONLY with a valid JSON object in this exact format:
-{{
-  "answer": "YES|NO|UNKNOWN",
-  "justification": "Brief explanation with context reference",
-  "source_clause": "Exact clause/section reference or null",
-  "confidence": 0.0-1.0
-}}
-
-Do NOT add any text outside the JSON object."""
-
-    payload = {
-        "model": "mistralai/Mixtral-8x7B-Instruct-v0.1",
-        "messages": [
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": user_message}
-        ],
-        "temperature": temperature,
-        "max_tokens": 500
-    }
+    deadline = deadline or Deadline()
+    if deadline.remaining() < LLM_MIN_TIMEOUT_S:
+        deadline.degrade("No time left for the LLM call")
+        return fallback_response("Query deadline reached before the policy could be analysed.")
 
     try:
-        response = requests.post("https://api.together.xyz/v1/chat/completions", 
-                               headers=headers, json=payload, timeout=30)
-        response.raise_for_status()
-        result = response.json()
-        
-        raw_output = result.get("choices", [{}])[0].get("message", {}).get("content", "")
-        
-        # Extract JSON from response
-        import re
-        json_match = re.search(r'\{.*\}', raw_output, re.DOTALL)
-        if json_match:
-            json_str = json_match.group(0)
-            parsed = json.loads(json_str)
-            if all(key in parsed for key in ["answer", "justification", "source_clause", "confidence"]):
-                return json.dumps(parsed, indent=2)
-        
-        # Fallback response
-        fallback_response = {
-            "answer": "UNKNOWN",
-            "justification": "Unable to process the query due to technical issues.",
-            "source_clause": None,
-            "confidence": 0.0
-        }
-        return json.dumps(fallback_response, indent=2)
-        
+        return ask_llm(query, context, deadline=deadline, temperature=temperature, stats=stats)
     except Exception as e:
-        fallback_response = {
-            "answer": "UNKNOWN",
-            "justification": f"Error during processing: {str(e)}",
-            "source_clause": None,
-            "confidence": 0.0
-        }
-        return json.dumps(fallback_response, indent=2)
+        return fallback_response(f"Error during processing: {str(e)}")
@@ -0,0 +1,82 @@
+# Re-chunks the indexed documents from the page store with new chunking parameters, without opening
+# any PDF. By default it only reports chunk statistics (seconds); --publish embeds and publishes the
+# result as a new store version.
+#
+# Run from the scripts/ folder, like extract_and_embed.py:
+#   python rechunk.py --max-tokens 400 --overlap 30
+#   python rechunk.py --max-tokens 400 --overlap 30 --publish
+
+import os
+import sys
+import time
+import argparse
+
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'utils'))
+
+from extraction import PageStore, load_page_store
+from vector_store import load_current_snapshot
+from tenants import tenant_store_dir
+from shards import SHARD_STRATEGIES
+from warmup import WARMUP_QUERIES
+from extract_and_embed import (PAGE_STORE_DIR, VECTOR_STORE_DIR, MIN_TOKENS, MAX_TOKENS, OVERLAP_TOKENS,
+                               chunk_all_texts, embed_and_publish)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Re-chunk indexed documents from the page store")
+    parser.add_argument("--tenant", help="Re-chunk this client's store")
+    parser.add_argument("--min-tokens", type=int, default=MIN_TOKENS)
+    parser.add_argument("--max-tokens", type=int, default=MAX_TOKENS)
+    parser.add_argument("--overlap", type=int, default=OVERLAP_TOKENS)
+    parser.add_argument("--publish", action="store_true", help="Embed and publish the new chunks as a store version")
+    parser.add_argument("--shards", type=int, default=0)
+    parser.add_argument("--shard-by", choices=SHARD_STRATEGIES, default="doc")
+    parser.add_argument("--warm-up", type=int, default=WARMUP_QUERIES, help="Hot queries to precompute after --publish")
+    args = parser.parse_args()
+
+    store_dir = tenant_store_dir(args.tenant, VECTOR_STORE_DIR) if args.tenant else VECTOR_STORE_DIR
+    current = load_current_snapshot(store_dir)
+    page_keys = current.manifest.get("page_store")
+    if not page_keys:
+        # Stores built before the page store: use every document it holds
+        page_keys = PageStore(PAGE_STORE_DIR).documents()
+        print(f"⚠️ Version {current.version} doesn't record its page store entries, using all {len(page_keys)} stored documents")
+    if not page_keys:
+        print("❌ Page store is empty, run extract_and_embed.py first")
+        return
+
+    t0 = time.perf_counter()
+    all_texts = load_page_store(page_keys, PAGE_STORE_DIR)
+    load_s = time.perf_counter() - t0
+    print(f"📄 Loaded {sum(len(p) for p in all_texts.values())} pages of {len(all_texts)} documents in {load_s:.2f}s")
+
+    from transformers import AutoTokenizer
+    tokenizer = AutoTokenizer.from_pretrained("sentence-transformers/all-mpnet-base-v2")
+    t0 = time.perf_counter()
+    all_chunks, chunk_meta = chunk_all_texts(all_texts, tokenizer, args.min_tokens, args.max_tokens, args.overlap)
+    chunk_s = time.perf_counter() - t0
+
+    tokens = [meta.get("token_count", 0) for meta in chunk_meta]
+    print(f"\n✂️ min_tokens={args.min_tokens} max_tokens={args.max_tokens} overlap={args.overlap}: "
+          f"{len(all_chunks)} chunks in {chunk_s:.2f}s (current version: {len(current.metadata)} chunks)")
+    print(f"🔹 Tokens per chunk: mean {np.mean(tokens):.0f}, p50 {np.percentile(tokens, 50):.0f}, "
+          f"p95 {np.percentile(tokens, 95):.0f}, max {max(tokens)}")
+    for doc in all_texts:
+        print(f"   {doc}: {sum(1 for meta in chunk_meta if meta['doc'] == doc)} chunks")
+
+    if args.publish:
+        manifest_extra = {
+            "page_store": page_keys,
+            "chunking": {"min_tokens": args.min_tokens, "max_tokens": args.max_tokens, "overlap_tokens": args.overlap},
+        }
+        embed_and_publish(all_texts, all_chunks, chunk_meta, store_dir, manifest_extra,
+                          shards=args.shards, shard_by=args.shard_by)
+        if args.warm_up > 0:
+            from warm_up import warm_up_store
+            warm_up_store(store_dir, args.warm_up, tenant=args.tenant)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+# Precomputes retrieval for the most frequent questions right after a store rebuild, so the first
+# users of a new version don't pay the cold embedding/search/re-ranking cost. The results are saved
+# in the current version's directory and picked up by the query path (retrieve_context).
+#
+# Runs automatically at the end of extract_and_embed.py (and rechunk.py --publish); to run it again,
+# from the scripts/ folder:
+#   python warm_up.py --top 100
+#   python warm_up.py --tenant acme
+
+import os
+import sys
+import time
+import argparse
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'utils'))
+
+from models import get_embedder
+from vector_store import load_current_snapshot
+from tenants import tenant_store_dir
+from query_log import query_log_path
+from warmup import WARMUP_QUERIES, hot_queries, build_warm_table, write_warm_table
+from query_and_respond import retrieve_context
+
+VECTOR_STORE_DIR = "../outputs/vector_store/"
+SEED_FILE = "../test_cases.json"
+REPO_ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+
+def default_query_log():
+    """The query log the app and CLI write to (QUERY_LOG_PATH is relative to the repository root)."""
+    path = query_log_path()
+    return os.path.join(REPO_ROOT, path) if path else None
+
+
+def warm_up_store(store_dir=VECTOR_STORE_DIR, top_n=WARMUP_QUERIES, log_path=None, seed_path=SEED_FILE,
+                  tenant=None):
+    """Builds the warm table of the current version of `store_dir`. Returns the number of queries warmed.
+
+    log_path defaults to the query log the app and CLI write to.
+    """
+    log_path = log_path or default_query_log()
+    queries = hot_queries(top_n, log_path=log_path, seed_path=seed_path, tenant=tenant)
+    if not queries:
+        print("⚠️ No queries in the query log or seed file, nothing to warm up")
+        return 0
+
+    snapshot = load_current_snapshot(store_dir)
+    print(f"🔥 Warming up version {snapshot.version} with {len(queries)} hot queries...")
+    start = time.perf_counter()
+    embeddings = get_embedder().encode([query for query, _ in queries])
+    results = []
+    for (query, params), embedding in zip(queries, embeddings):
+        results.append(retrieve_context(snapshot, query, params["num_chunks"], adaptive=params["adaptive"],
+                                        compress=params["compress"], query_embedding=embedding, use_warm=False))
+
+    path = write_warm_table(snapshot.path, build_warm_table(snapshot.version, queries, embeddings, results))
+    print(f"✅ Precomputed retrieval for {len(queries)} queries in {time.perf_counter() - start:.1f}s "
+          f"({os.path.getsize(path) / 1024:.0f} KB)")
+    return len(queries)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Precompute retrieval for hot queries of the current store version")
+    parser.add_argument("--tenant", help="Warm up this client's store")
+    parser.add_argument("--top", type=int, default=WARMUP_QUERIES, help="Number of hot queries to precompute")
+    parser.add_argument("--log", help="Query log to take the most frequent questions from (default: QUERY_LOG_PATH)")
+    parser.add_argument("--seed", default=SEED_FILE, help="Seed questions used when the log has too few")
+    args = parser.parse_args()
+
+    store_dir = tenant_store_dir(args.tenant, VECTOR_STORE_DIR) if args.tenant else VECTOR_STORE_DIR
+    warm_up_store(store_dir, args.top, args.log, args.seed, tenant=args.tenant)
+
+
+if __name__ == "__main__":
+    main()
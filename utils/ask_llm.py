@@ -1,53 +1,32 @@
 import os
 import requests
 import json
-import re
 import time
 
+from structured_output import parse_llm_response, StreamValidator
+from deadline import Deadline
+
 TOGETHER_URL = "https://api.together.xyz/v1/chat/completions"
+LLM_MODEL = "mistralai/Mixtral-8x7B-Instruct-v0.1"
+MAX_TOKENS = 500
+LLM_TIMEOUT_S = 30       # Per-request cap; shortened to whatever is left of the query deadline
+LLM_MIN_TIMEOUT_S = 3.0  # With less time than this left, don't call (or retry) the LLM at all
+RETRY_SLEEP_S = 2
 
-def extract_json(text):
-    """Attempts to extract and clean a JSON object from raw text."""
-    try:
-        # First, try to find JSON blocks with various patterns
-        patterns = [
-            r'\{[^{}]*(?:\{[^{}]*\}[^{}]*)*\}',  # Nested JSON
-            r'\{.*?\}',  # Simple JSON
-            r'\{[^}]*"answer"[^}]*"justification"[^}]*"source_clause"[^}]*"confidence"[^}]*\}',  # Specific format
-        ]
-        
-        for pattern in patterns:
-            matches = re.findall(pattern, text, re.DOTALL)
-            for match in matches:
-                try:
-                    # Clean common formatting issues
-                    cleaned = match.replace('\\n', '\n').replace('\\"', '"').replace("\\'", "'").replace('\\\\', '\\')
-                    # Remove any trailing commas before closing braces
-                    cleaned = re.sub(r',\s*}', '}', cleaned)
-                    cleaned = re.sub(r',\s*]', ']', cleaned)
-                    
-                    parsed = json.loads(cleaned)
-                    # Validate required fields
-                    if all(key in parsed for key in ["answer", "justification", "source_clause", "confidence"]):
-                        return cleaned
-                except json.JSONDecodeError:
-                    continue
-        
-        return None
-    except Exception as e:
-        print(f"⚠️ extract_json error: {e}")
-        return None
-
-
-def call_llm(api_key, system_prompt, query, context):
-    """Calls the Together API and returns raw LLM output."""
-    headers = {
-        "Authorization": f"Bearer {api_key}",
-        "Content-Type": "application/json"
-    }
 
-    # Improved user message with clearer instructions
-    user_message = f"""Context:
+def fallback_response(justification="Unable to process the query due to technical issues."):
+    """UNKNOWN answer returned when no valid response can be obtained in time."""
+    return json.dumps({
+        "answer": "UNKNOWN",
+        "justification": justification,
+        "source_clause": None,
+        "confidence": 0.0
+    }, indent=2)
+
+
+def build_user_message(query, context):
+    """Improved user message with clearer instructions"""
+    return f"""Context:
 {context}
 
 Question: {query}
@@ -62,26 +41,75 @@ IMPORTANT: Respond ONLY with a valid JSON object in this exact format:
 
 Do NOT add any text outside the JSON object."""
 
+
+def stream_llm(api_key, system_prompt, query, context, temperature=0.1, timeout=LLM_TIMEOUT_S, deadline=None):
+    """Streams a completion through a StreamValidator, cancelling it as soon as the output can't
+    become a valid response (or once a valid object has closed).
+
+    `timeout` only bounds the wait for each chunk; with a Deadline the stream is also closed once the
+    budget is gone. Returns (raw_output, stream stats: status, reason, tokens received, tokens saved
+    and whether the deadline cut the stream). Tokens saved only counts aborted streams and is an
+    upper bound: MAX_TOKENS minus the tokens received before the abort.
+    Raises requests.RequestException on API errors.
+    """
+    headers = {
+        "Authorization": f"Bearer {api_key}",
+        "Content-Type": "application/json"
+    }
+
     payload = {
-        "model": "mistralai/Mixtral-8x7B-Instruct-v0.1",
+        "model": LLM_MODEL,
         "messages": [
             {"role": "system", "content": system_prompt},
-            {"role": "user", "content": user_message}
+            {"role": "user", "content": build_user_message(query, context)}
         ],
-        "temperature": 0.1,  # Lower temperature for more consistent JSON
-        "max_tokens": 500
+        "temperature": temperature,
+        "max_tokens": MAX_TOKENS,
+        "stream": True
     }
 
-    try:
-        response = requests.post(TOGETHER_URL, headers=headers, json=payload, timeout=30)
+    validator = StreamValidator()
+    tokens = 0
+    timed_out = False
+    # Leaving the `with` block closes the connection, which cancels the generation server-side
+    with requests.post(TOGETHER_URL, headers=headers, json=payload, timeout=timeout, stream=True) as response:
         response.raise_for_status()
-        return response.json()
-    except requests.exceptions.RequestException as e:
-        print(f"❌ API request failed: {e}")
-        return None
+        for line in response.iter_lines(decode_unicode=True):
+            if not line or not line.startswith("data:"):
+                continue
+            data = line[len("data:"):].strip()
+            if data == "[DONE]":
+                break
+            delta = json.loads(data).get("choices", [{}])[0].get("delta", {}).get("content") or ""
+            if not delta:
+                continue
+            tokens += 1
+            if validator.feed(delta) != StreamValidator.OK:
+                break
+            if deadline is not None and deadline.expired():
+                timed_out = True
+                break
+
+    aborted = validator.status == StreamValidator.ABORT
+    return "".join(validator.text), {
+        "status": validator.status,
+        "reason": validator.reason,
+        "tokens": tokens,
+        "tokens_saved": max(0, MAX_TOKENS - tokens) if aborted else 0,
+        "timed_out": timed_out,
+    }
 
-def ask_llm(query, context):
-    """Main function to get clean JSON from the LLM with retry."""
+def ask_llm(query, context, deadline=None, temperature=0.1, stats=None):
+    """Main function to get clean JSON from the LLM with retry.
+
+    The completion is streamed and validated as it arrives: malformed output is cancelled early and
+    retried at once with a stronger instruction; only API errors wait RETRY_SLEEP_S before retrying.
+    With a Deadline, each request's timeout is capped by the time left and no further attempt (or
+    retry sleep) is started once too little remains; a stream still running when the budget is gone
+    is closed and the fallback returned. If a `stats` dict is passed it receives the attempts made,
+    abort reasons and tokens received/saved.
+    """
+    deadline = deadline or Deadline()
     api_key = os.getenv("TOGETHER_API_KEY")
     if not api_key:
         raise EnvironmentError("❌ TOGETHER_API_KEY not found in environment variables.")
@@ -90,49 +118,49 @@ def ask_llm(query, context):
     with open("prompts/system_prompt.txt", "r") as f:
         system_prompt = f.read()
 
+    llm_stats = {"attempts": 0, "aborted": [], "tokens": 0, "tokens_saved": 0}
+    if stats is not None:
+        stats["llm"] = llm_stats
+
     max_retries = 3
     for attempt in range(max_retries):
+        if deadline.remaining() < LLM_MIN_TIMEOUT_S:
+            deadline.degrade(f"No time left for LLM attempt {attempt + 1}")
+            break
         print(f"🔄 Attempt {attempt + 1}/{max_retries}")
-        
-        result = call_llm(api_key, system_prompt, query, context)
-        
-        if not result:
-            print("❌ API call failed")
-            time.sleep(2)
+        llm_stats["attempts"] += 1
+
+        try:
+            with deadline.stage("llm"):
+                raw_output, stream = stream_llm(api_key, system_prompt, query, context, temperature,
+                                                timeout=deadline.timeout(LLM_TIMEOUT_S), deadline=deadline)
+        except (requests.exceptions.RequestException, ValueError) as e:
+            print(f"❌ API request failed: {e}")
+            if deadline.remaining() > RETRY_SLEEP_S + LLM_MIN_TIMEOUT_S:
+                time.sleep(RETRY_SLEEP_S)
             continue
 
-        # Debugging: show raw response
-        print("🔍 Raw API response:")
-        print(json.dumps(result, indent=2))
-
-        raw_output = result.get("choices", [{}])[0].get("message", {}).get("content", "")
-        json_str = extract_json(raw_output)
-
-        if json_str:
-            try:
-                parsed = json.loads(json_str)
-                # Validate the response
-                if all(key in parsed for key in ["answer", "justification", "source_clause", "confidence"]):
-                    print(f"✅ Successfully parsed JSON with all required fields")
-                    return json.dumps(parsed, indent=2)
-                else:
-                    print(f"⚠️ Missing required fields in JSON: {parsed}")
-                    print(f"🧪 Available fields: {list(parsed.keys())}")
-            except json.JSONDecodeError as e:
-                print(f"⚠️ Failed to parse cleaned JSON: {e}")
-                print(f"🧪 Cleaned JSON candidate:\n{json_str}")
-
-        # Retry with stronger instruction
-        time.sleep(2)
+        llm_stats["tokens"] += stream["tokens"]
+        llm_stats["tokens_saved"] += stream["tokens_saved"]
+        if stream["timed_out"]:
+            deadline.degrade(f"LLM stream closed at the query deadline after {stream['tokens']} tokens")
+            return fallback_response("Query deadline reached before the policy could be analysed.")
+        if stream["status"] != StreamValidator.ABORT:
+            parsed = parse_llm_response(raw_output)
+            if parsed is not None:
+                print(f"✅ Successfully parsed JSON with all required fields ({stream['tokens']} tokens streamed)")
+                return json.dumps(parsed, indent=2)
+            reason = "no valid response object in output"
+        else:
+            reason = stream["reason"]
+        llm_stats["aborted"].append(reason)
+        saved = f", saved up to {stream['tokens_saved']} tokens" if stream["tokens_saved"] else ""
+        print(f"✂️ Invalid output after {stream['tokens']} tokens ({reason}){saved}:\n{raw_output}")
+
+        # Retry at once with a stronger instruction
         if attempt < max_retries - 1:
             system_prompt += "\n\n🛑 CRITICAL: You MUST respond with ONLY a valid JSON object. No other text."
 
     # If all retries fail, return a fallback response
     print("❌ All retries failed, returning fallback response")
-    fallback_response = {
-        "answer": "UNKNOWN",
-        "justification": "Unable to process the query due to technical issues.",
-        "source_clause": None,
-        "confidence": 0.0
-    }
-    return json.dumps(fallback_response, indent=2)
+    return fallback_response()
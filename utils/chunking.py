@@ -0,0 +1,120 @@
+import re
+
+def split_sentences(text):
+    """Splits text into sentences on terminal punctuation."""
+    sentences = re.split(r'(?<=[.!?])\s+', text)
+    return [s.strip() for s in sentences if s.strip()]
+
+# Common legal document patterns, with their level in the section tree
+# (0 = section, 1 = clause/definition/exclusion/caps heading, 2 = numbered item)
+SEMANTIC_BOUNDARY_PATTERNS = [
+    (r'\b(?:SECTION|Section|section)\s+[A-Z]?[0-9]*[\.\)]?\s*[A-Z]', 0),  # Section headers
+    (r'\b(?:CLAUSE|Clause|clause)\s+[0-9]+[\.\)]?\s*[A-Z]', 1),  # Clause headers
+    (r'\b(?:DEFINITION|Definition|definition)\s+[0-9]+[\.\)]?\s*[A-Z]', 1),  # Definition headers
+    (r'\b(?:EXCLUSION|Exclusion|exclusion)\s+[0-9]+[\.\)]?\s*[A-Z]', 1),  # Exclusion headers
+    (r'\b[A-Z][A-Z\s]{3,}:\s*[A-Z]', 1),  # All caps headers
+    (r'\b[0-9]+[\.\)]\s*[A-Z][a-z]', 2),  # Numbered items
+]
+
+def find_semantic_boundaries(text):
+    """Find natural boundaries like section headers, clause numbers, etc."""
+    boundaries = []
+    for pattern, _ in SEMANTIC_BOUNDARY_PATTERNS:
+        matches = re.finditer(pattern, text)
+        for match in matches:
+            boundaries.append(match.start())
+    
+    return sorted(boundaries)
+
+def find_section_headers(text):
+    """Like find_semantic_boundaries, but returns sorted (position, level) pairs, one per position."""
+    levels = {}
+    for pattern, level in SEMANTIC_BOUNDARY_PATTERNS:
+        for match in re.finditer(pattern, text):
+            levels[match.start()] = min(level, levels.get(match.start(), level))
+    return sorted(levels.items())
+
+def improved_semantic_chunk_pdf_text(text, filename, page_number=None, min_tokens=150, max_tokens=300, overlap_tokens=50, tokenizer=None):
+    """Improved chunking with semantic boundaries and better text processing."""
+    if tokenizer is None:
+        from transformers import AutoTokenizer
+        tokenizer = AutoTokenizer.from_pretrained("sentence-transformers/all-MiniLM-L6-v2")
+
+    # Clean and normalize text
+    text = re.sub(r'\s+', ' ', text.strip())
+    
+    # Find semantic boundaries
+    boundaries = find_semantic_boundaries(text)
+    
+    # Split into sentences
+    sentences = split_sentences(text)
+    
+    chunks = []
+    meta = []
+    current_chunk = []
+    current_tokens = 0
+    chunk_index = 0
+    i = 0
+    
+    while i < len(sentences):
+        sentence = sentences[i]
+        sentence_tokens = len(tokenizer.tokenize(sentence))
+
+        # Handle very long sentences
+        if sentence_tokens > max_tokens:
+            print(f"✂️ Truncating long sentence on page {page_number} of {filename}")
+            tokens = tokenizer.tokenize(sentence)[:max_tokens]
+            sentence = tokenizer.convert_tokens_to_string(tokens)
+            sentence_tokens = len(tokens)
+
+        # Check if adding this sentence would exceed max_tokens
+        if current_tokens + sentence_tokens <= max_tokens:
+            current_chunk.append(sentence)
+            current_tokens += sentence_tokens
+            i += 1
+        else:
+            # If we have enough content, create a chunk
+            if current_tokens >= min_tokens:
+                chunk_text = " ".join(current_chunk).strip()
+                chunks.append(chunk_text)
+                meta.append({
+                    "doc": filename,
+                    "page": page_number,
+                    "chunk_index": chunk_index,
+                    "text": chunk_text,
+                    "token_count": current_tokens
+                })
+                chunk_index += 1
+
+                # Create overlap: keep last sentences that fit within overlap_tokens
+                overlap = []
+                overlap_tokens_used = 0
+                for sent in reversed(current_chunk):
+                    sent_tokens = len(tokenizer.tokenize(sent))
+                    if overlap_tokens_used + sent_tokens <= overlap_tokens:
+                        overlap.insert(0, sent)
+                        overlap_tokens_used += sent_tokens
+                    else:
+                        break
+                
+                current_chunk = overlap
+                current_tokens = overlap_tokens_used
+            else:
+                # Force add the sentence if we're below min_tokens
+                current_chunk.append(sentence)
+                current_tokens += sentence_tokens
+                i += 1
+
+    # Add final chunk
+    if current_chunk:
+        chunk_text = " ".join(current_chunk).strip()
+        chunks.append(chunk_text)
+        meta.append({
+            "doc": filename,
+            "page": page_number,
+            "chunk_index": chunk_index,
+            "text": chunk_text,
+            "token_count": current_tokens
+        })
+
+    return chunks, meta
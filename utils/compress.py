@@ -0,0 +1,134 @@
+import math
+import re
+import time
+
+from chunking import split_sentences, find_semantic_boundaries
+from models import get_cross_encoder
+
+COMPRESS_RATIO = 0.4  # Fraction of context tokens kept after compression
+HEADER_WORDS = 10     # Words of a section header carried along with a kept sentence
+MIN_SENTENCE_TOKENS = 4  # Shorter fragments ("23.", "b.") are merged into the next sentence
+
+
+def approx_tokens(text):
+    """Cheap tokenizer-free token estimate (words and punctuation)."""
+    return len(re.findall(r"\w+|[^\w\s]", text))
+
+
+def _merge_fragments(sentences):
+    """Attaches list markers and other tiny fragments to the sentence that follows them."""
+    merged = []
+    carry = ""
+    for sentence in sentences:
+        sentence = f"{carry} {sentence}".strip() if carry else sentence
+        if approx_tokens(sentence) < MIN_SENTENCE_TOKENS:
+            carry = sentence
+            continue
+        merged.append(sentence)
+        carry = ""
+    if carry:
+        if merged:
+            merged[-1] = f"{merged[-1]} {carry}"
+        else:
+            merged.append(carry)
+    return merged
+
+
+def _sentence_headers(sentences):
+    """For each sentence, the index of the sentence holding the header it falls under (or None)."""
+    owners = []
+    current = None
+    for i, sentence in enumerate(sentences):
+        boundaries = find_semantic_boundaries(sentence)
+        if boundaries and boundaries[0] == 0:
+            current = i
+        owners.append(current)
+        if boundaries:
+            # A header inside this sentence governs the sentences that follow it
+            current = i
+    return owners
+
+
+def _header_snippet(sentence):
+    boundaries = find_semantic_boundaries(sentence)
+    start = boundaries[-1] if boundaries else 0
+    return " ".join(sentence[start:].split()[:HEADER_WORDS])
+
+
+def compress_chunks(query, chunks, target_ratio=COMPRESS_RATIO, cross_encoder=None):
+    """Query-aware extractive compression of re-ranked chunks.
+
+    Every sentence is scored against the query with the cross-encoder; the best sentences are kept
+    until `target_ratio` of the original tokens is used, together with the section header each one
+    falls under. Chunks keep their doc/page metadata, so citations survive; chunks left without any
+    sentence are dropped.
+
+    Returns (compressed chunks, stats).
+    """
+    start = time.perf_counter()
+    sentences = []  # (chunk position, sentence position, text)
+    per_chunk = []
+    for c, chunk in enumerate(chunks):
+        chunk_sentences = _merge_fragments(split_sentences(chunk["text"]))
+        per_chunk.append(chunk_sentences)
+        sentences.extend((c, s, text) for s, text in enumerate(chunk_sentences))
+
+    original_tokens = sum(approx_tokens(chunk["text"]) for chunk in chunks)
+    stats = {"original_tokens": original_tokens, "compressed_tokens": original_tokens, "tokens_saved": 0,
+             "sentences_total": len(sentences), "sentences_kept": len(sentences), "chunks_kept": len(chunks)}
+    if not sentences:
+        return chunks, stats
+
+    try:
+        model = cross_encoder or get_cross_encoder()
+        scores = model.predict([[query, text] for _, _, text in sentences])
+    except Exception as e:
+        # If the cross-encoder fails, send the chunks uncompressed
+        print(f"⚠️ Context compression failed: {e}")
+        return chunks, stats
+
+    budget = max(1, math.ceil(target_ratio * original_tokens))
+    header_owners = [_sentence_headers(chunk_sentences) for chunk_sentences in per_chunk]
+
+    kept = set()
+    used = 0
+    for (c, s, text), _ in sorted(zip(sentences, scores), key=lambda x: x[1], reverse=True):
+        cost = approx_tokens(text)
+        owner = header_owners[c][s]
+        if owner is not None and owner != s and (c, owner) not in kept:
+            cost += approx_tokens(_header_snippet(per_chunk[c][owner]))
+        if kept and used + cost > budget:
+            continue
+        kept.add((c, s))
+        used += cost
+
+    compressed = []
+    for c, chunk in enumerate(chunks):
+        kept_positions = sorted(s for (kc, s) in kept if kc == c)
+        if not kept_positions:
+            continue
+
+        parts = []
+        previous = None
+        headers_added = set()
+        for s in kept_positions:
+            owner = header_owners[c][s]
+            if owner is not None and owner != s and owner not in kept_positions and owner not in headers_added:
+                parts.append(f"[{_header_snippet(per_chunk[c][owner])}]")
+                headers_added.add(owner)
+            elif previous is not None and s != previous + 1:
+                parts.append("...")
+            parts.append(per_chunk[c][s])
+            previous = s
+
+        compressed.append({**chunk, "text": " ".join(parts), "compressed": True})
+
+    compressed_tokens = sum(approx_tokens(chunk["text"]) for chunk in compressed)
+    stats.update(
+        compressed_tokens=compressed_tokens,
+        tokens_saved=original_tokens - compressed_tokens,
+        sentences_kept=len(kept),
+        chunks_kept=len(compressed),
+        compress_ms=(time.perf_counter() - start) * 1000,
+    )
+    return compressed, stats
@@ -0,0 +1,68 @@
+import time
+from contextlib import contextmanager
+
+
+class DeadlineExceeded(Exception):
+    """Raised when a query's time budget runs out before a stage can start."""
+
+
+class Deadline:
+    """Overall time budget of one query, shared by every pipeline stage.
+
+    Stages run inside stage() (which refuses to start once the budget is gone and records the time
+    spent), bound blocking calls with timeout(), and call degrade() when they cut work short to fit.
+    budget_s=None means no deadline.
+    """
+
+    def __init__(self, budget_s=None):
+        self.budget_s = budget_s
+        self.start = time.monotonic()
+        self.stages_ms = {}
+        self.degraded = []
+
+    def elapsed(self):
+        return time.monotonic() - self.start
+
+    def remaining(self):
+        if self.budget_s is None:
+            return float("inf")
+        return max(0.0, self.budget_s - self.elapsed())
+
+    def expired(self):
+        return self.remaining() <= 0
+
+    def check(self, stage):
+        if self.expired():
+            raise DeadlineExceeded(f"Query deadline of {self.budget_s:.0f}s exceeded before {stage}")
+
+    def timeout(self, cap):
+        """Timeout for a blocking call: `cap`, or whatever is left of the budget if that's less."""
+        return min(cap, self.remaining())
+
+    @contextmanager
+    def stage(self, name):
+        self.check(name)
+        t0 = time.monotonic()
+        try:
+            yield
+        finally:
+            self.stages_ms[name] = self.stages_ms.get(name, 0.0) + (time.monotonic() - t0) * 1000
+
+    def degrade(self, note):
+        self.degraded.append(note)
+        print(f"⏳ {note} ({self.remaining():.1f}s left)")
+
+    def report(self):
+        return {
+            "budget_s": self.budget_s,
+            "elapsed_s": self.elapsed(),
+            "remaining_s": None if self.budget_s is None else self.remaining(),
+            "stages_ms": dict(self.stages_ms),
+            "degraded": list(self.degraded),
+        }
+
+    def summary(self):
+        """One-line stage breakdown for CLI output."""
+        stages = ", ".join(f"{name} {ms:.0f} ms" for name, ms in self.stages_ms.items())
+        budget = f" of {self.budget_s:.0f}s budget" if self.budget_s is not None else ""
+        return f"⏱️ {self.elapsed():.1f}s{budget}: {stages}"
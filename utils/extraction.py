@@ -0,0 +1,130 @@
+import os
+import re
+import json
+import mmap
+import hashlib
+from datetime import datetime, timezone
+
+# === Page store ===
+# outputs/page_store/
+#   <key>.jsonl   -> one {"page": N, "text": ...} line per non-empty page
+#   <key>.json    -> {"source", "sha256", "pages": [[page, offset, length], ...], ...} (written last)
+# <key> is the first 16 hex digits of the PDF's SHA-256, so an unchanged PDF is never parsed twice
+# and identical PDFs in different tenants' libraries share one entry.
+PAGE_STORE_DIR = "outputs/page_store"
+KEY_LENGTH = 16
+
+
+def extract_text_from_pdf(pdf_path):
+    import fitz  # PyMuPDF; only needed when a PDF is actually parsed
+
+    doc = fitz.open(pdf_path)
+    texts = []
+    for page_num, page in enumerate(doc, start=1):
+        page_text = page.get_text()
+        # Clean up the text
+        page_text = re.sub(r'\s+', ' ', page_text)  # Normalize whitespace
+        page_text = page_text.strip()
+        if page_text:  # Only add non-empty pages
+            texts.append((page_text, page_num))
+    return texts  # List of (text, page_number)
+
+
+def pdf_sha256(pdf_path):
+    digest = hashlib.sha256()
+    with open(pdf_path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class PageStore:
+    """Extracted page texts keyed by PDF hash, read back through mmap without touching the PDFs."""
+
+    def __init__(self, store_dir=PAGE_STORE_DIR):
+        self.store_dir = store_dir
+
+    def _paths(self, key):
+        return os.path.join(self.store_dir, f"{key}.jsonl"), os.path.join(self.store_dir, f"{key}.json")
+
+    def has(self, key):
+        return os.path.exists(self._paths(key)[1])
+
+    def info(self, key):
+        with open(self._paths(key)[1], "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def write(self, key, sha256, source, page_texts):
+        """Stores [(text, page_number), ...]; the index file is renamed into place last."""
+        os.makedirs(self.store_dir, exist_ok=True)
+        pages_path, info_path = self._paths(key)
+
+        offsets = []
+        tmp_pages = f"{pages_path}.{os.getpid()}.tmp"
+        with open(tmp_pages, "wb") as f:
+            for text, page_num in page_texts:
+                line = (json.dumps({"page": page_num, "text": text}, ensure_ascii=False) + "\n").encode("utf-8")
+                offsets.append([page_num, f.tell(), len(line)])
+                f.write(line)
+        os.replace(tmp_pages, pages_path)
+
+        info = {
+            "source": source,
+            "sha256": sha256,
+            "pages": offsets,
+            "extracted_at": datetime.now(timezone.utc).isoformat(),
+        }
+        tmp_info = f"{info_path}.{os.getpid()}.tmp"
+        with open(tmp_info, "w", encoding="utf-8") as f:
+            json.dump(info, f)
+        os.replace(tmp_info, info_path)
+
+    def read(self, key, page_numbers=None):
+        """Returns [(text, page_number), ...] for all pages, or only `page_numbers`."""
+        pages_path, _ = self._paths(key)
+        wanted = set(page_numbers) if page_numbers is not None else None
+        page_texts = []
+        with open(pages_path, "rb") as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return []
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                for page_num, offset, length in self.info(key)["pages"]:
+                    if wanted is None or page_num in wanted:
+                        page_texts.append((json.loads(data[offset:offset + length])["text"], page_num))
+        return page_texts
+
+    def documents(self):
+        """{source filename: key} for every stored PDF, newest extraction per filename."""
+        if not os.path.isdir(self.store_dir):
+            return {}
+        latest = {}
+        for filename in os.listdir(self.store_dir):
+            if not filename.endswith(".json"):
+                continue
+            key = filename[:-len(".json")]
+            info = self.info(key)
+            if info["source"] not in latest or info["extracted_at"] > latest[info["source"]][1]:
+                latest[info["source"]] = (key, info["extracted_at"])
+        return {source: key for source, (key, _) in sorted(latest.items())}
+
+
+def extract_with_cache(pdf_path, store_dir=PAGE_STORE_DIR):
+    """Page texts of a PDF from the page store, extracting (and storing) them only if the PDF is new.
+
+    Returns (key, page_texts, cached).
+    """
+    store = PageStore(store_dir)
+    sha256 = pdf_sha256(pdf_path)
+    key = sha256[:KEY_LENGTH]
+    if store.has(key):
+        return key, store.read(key), True
+
+    page_texts = extract_text_from_pdf(pdf_path)
+    store.write(key, sha256, os.path.basename(pdf_path), page_texts)
+    return key, page_texts, False
+
+
+def load_page_store(page_keys, store_dir=PAGE_STORE_DIR):
+    """{doc: [(text, page_number), ...]} for {doc: key}, e.g. a store version's manifest["page_store"]."""
+    store = PageStore(store_dir)
+    return {doc: store.read(key) for doc, key in page_keys.items()}
@@ -0,0 +1,35 @@
+import threading
+
+from sentence_transformers import SentenceTransformer, CrossEncoder
+
+# Use the same model as in embedding for consistency
+EMBEDDING_MODEL = "all-mpnet-base-v2"
+CROSS_ENCODER_MODEL = "cross-encoder/ms-marco-MiniLM-L-6-v2"
+FIRST_PASS_CROSS_ENCODER_MODEL = "cross-encoder/ms-marco-TinyBERT-L-2-v2"
+
+_models = {}
+_models_lock = threading.Lock()
+
+
+def _get_model(key, loader):
+    with _models_lock:
+        if key not in _models:
+            _models[key] = loader()
+        return _models[key]
+
+
+def get_embedder(model_name=EMBEDDING_MODEL):
+    """Process-wide SentenceTransformer, loaded once instead of per query."""
+    return _get_model(("embedder", model_name), lambda: SentenceTransformer(model_name))
+
+
+def get_cross_encoder(model_name=CROSS_ENCODER_MODEL):
+    """Process-wide CrossEncoder, loaded once instead of per query."""
+    return _get_model(("cross_encoder", model_name), lambda: CrossEncoder(model_name))
+
+
+def load_query_models():
+    """Loads every model the query path uses, so a process's first query doesn't pay for it inside
+    its time budget (and doesn't report load time as embed/rerank time)."""
+    get_embedder()
+    get_cross_encoder()
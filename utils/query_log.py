@@ -0,0 +1,67 @@
+import os
+import json
+import threading
+from datetime import datetime, timezone
+
+QUERY_LOG_PATH = "outputs/query_log.jsonl"  # Override with QUERY_LOG_PATH; set it empty to disable logging
+
+_log_lock = threading.Lock()
+
+
+def query_log_path():
+    return os.getenv("QUERY_LOG_PATH", QUERY_LOG_PATH)
+
+
+def log_query(query, source, params, stats=None, chunk_ids=None, response=None, store_version=None):
+    """Appends one query record to the JSONL query log.
+
+    Records keep the completion time (`ts`), the start time (`epoch`, used for replay pacing), the
+    parameters the query ran with, the ids of the chunks retrieved (stats["retrieved_ids"]) and of
+    those sent to the LLM (`chunk_ids`), the per-stage timings and the answer. Logging failures are reported but never fail the query.
+    """
+    path = query_log_path()
+    if not path:
+        return
+
+    now = datetime.now(timezone.utc)
+    timing = (stats or {}).get("deadline", {})
+    record = {
+        "ts": now.isoformat(),
+        "epoch": now.timestamp() - (timing.get("elapsed_s") or 0.0),  # query start, used for replay pacing
+        "source": source,
+        "query": query,
+        "params": params,
+        "store_version": store_version,
+        "retrieved_ids": (stats or {}).get("retrieved_ids", []),
+        "chunk_ids": chunk_ids or [],
+        "stages_ms": timing.get("stages_ms", {}),
+        "elapsed_s": timing.get("elapsed_s"),
+        "degraded": timing.get("degraded", []),
+        "mode": (stats or {}).get("mode"),
+    }
+    if response is not None:
+        try:
+            record["answer"] = json.loads(response).get("answer")
+        except (ValueError, AttributeError):
+            record["answer"] = None
+
+    try:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        line = json.dumps(record, ensure_ascii=False) + "\n"
+        with _log_lock, open(path, "a", encoding="utf-8") as f:
+            f.write(line)
+    except OSError as e:
+        print(f"⚠️ Failed to write query log {path}: {e}")
+
+
+def read_query_log(path=None):
+    """Yields the records of a query log, skipping lines that aren't valid JSON (e.g. a torn last line)."""
+    with open(path or query_log_path(), "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except ValueError:
+                continue
@@ -0,0 +1,199 @@
+import hashlib
+import re
+import threading
+import time
+from collections import OrderedDict
+
+from models import get_cross_encoder, FIRST_PASS_CROSS_ENCODER_MODEL
+
+# Words that don't change what a coverage question is about
+_STOPWORDS = {
+    "a", "an", "the", "is", "are", "was", "were", "be", "been", "does", "do", "did", "will", "would",
+    "can", "could", "under", "in", "on", "of", "for", "to", "by", "with", "this", "that", "my", "me",
+    "i", "it", "any", "policy", "plan", "insurance", "there", "what", "which",
+}
+
+# First-pass score margins around the top-N boundary; candidates inside the band go to the cross-encoder.
+# "dense" scores are cosine similarities derived from FAISS L2 distances, "model" scores are TinyBERT logits.
+DEFAULT_MARGINS = {"dense": 0.05, "model": 1.0}
+
+
+def normalize_query(query):
+    """Reduces a query to a sorted bag of content-word stems so simple paraphrases share a cache key."""
+    tokens = re.findall(r"[a-z0-9]+", query.lower())
+    stems = set()
+    for token in tokens:
+        if token in _STOPWORDS:
+            continue
+        for suffix in ("ing", "ed", "es", "s"):
+            if len(token) > len(suffix) + 3 and token.endswith(suffix):
+                token = token[:-len(suffix)]
+                break
+        stems.add(token)
+    return " ".join(sorted(stems))
+
+
+def query_hash(query):
+    return hashlib.sha1(normalize_query(query).encode("utf-8")).hexdigest()
+
+
+class ScoreCache:
+    """Bounded LRU cache of (query-hash, chunk-id) -> cross-encoder score."""
+
+    def __init__(self, max_entries=50000):
+        self.max_entries = max_entries
+        self._scores = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            if key in self._scores:
+                self._scores.move_to_end(key)
+                self.hits += 1
+                return self._scores[key]
+            self.misses += 1
+            return None
+
+    def put(self, key, score):
+        with self._lock:
+            self._scores[key] = score
+            self._scores.move_to_end(key)
+            while len(self._scores) > self.max_entries:
+                self._scores.popitem(last=False)
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._scores), "hits": self.hits, "misses": self.misses}
+
+
+score_cache = ScoreCache()
+
+
+def _first_pass_scores(query, candidates, first_pass):
+    if first_pass == "model":
+        model = get_cross_encoder(FIRST_PASS_CROSS_ENCODER_MODEL)
+        return [float(s) for s in model.predict([[query, c["text"]] for c in candidates])]
+    # Embeddings are normalized, so squared L2 distance d maps to cosine similarity 1 - d/2
+    return [1.0 - float(c["distance"]) / 2.0 for c in candidates]
+
+
+def score_candidates(query, chunks, cache=score_cache, cache_namespace="", cross_encoder=None, qhash=None):
+    """Sets "rerank_score" on every chunk, using cached scores where possible.
+
+    Returns (number of cross-encoder predictions, number of cache hits).
+    """
+    qhash = qhash or query_hash(query)
+    to_predict = []
+    hits = 0
+    for chunk in chunks:
+        cached = cache.get((qhash, cache_namespace, chunk["id"])) if cache is not None else None
+        if cached is None:
+            to_predict.append(chunk)
+        else:
+            chunk["rerank_score"] = cached
+            hits += 1
+
+    if to_predict:
+        model = cross_encoder or get_cross_encoder()
+        scores = model.predict([[query, c["text"]] for c in to_predict])
+        for chunk, score in zip(to_predict, scores):
+            chunk["rerank_score"] = float(score)
+            if cache is not None:
+                cache.put((qhash, cache_namespace, chunk["id"]), chunk["rerank_score"])
+    return len(to_predict), hits
+
+
+def find_relevance_cliff(scores, min_keep=2, max_keep=10, min_drop=2.5):
+    """Number of leading items to keep from descending scores.
+
+    Cuts at the largest gap between consecutive scores within [min_keep, max_keep] when that gap is
+    at least `min_drop` (cross-encoder logits); otherwise keeps `max_keep`.
+    """
+    max_keep = min(max_keep, len(scores))
+    if max_keep <= min_keep:
+        return max_keep
+
+    best_cut, best_drop = max_keep, 0.0
+    for cut in range(min_keep, max_keep):
+        drop = scores[cut - 1] - scores[cut]
+        if drop > best_drop:
+            best_cut, best_drop = cut, drop
+    return best_cut if best_drop >= min_drop else max_keep
+
+
+def cascade_rerank(query, candidates, top_n=10, first_pass="dense", margin=None, batch_size=4,
+                   cache=score_cache, cache_namespace="", cross_encoder=None):
+    """Re-ranks retrieved chunks, sending only ambiguous candidates to the cross-encoder.
+
+    candidates: chunk dicts with "id", "text" and "distance" (FAISS L2), in FAISS order.
+    1. A cheap first pass (dense similarity, or a smaller cross-encoder) scores every candidate.
+    2. Candidates clearly above the top-N boundary are kept, those clearly below are dropped.
+    3. The ambiguous band around the boundary is scored by the cross-encoder in batches, best
+       first-pass first, stopping once a batch no longer changes which of them fill the open slots.
+    Cross-encoder scores are cached per (query hash, cache_namespace, chunk id).
+
+    Returns (ranked chunks, stats). Chunks get "first_pass_score" and, when scored, "rerank_score".
+    """
+    start = time.perf_counter()
+    stats = {"candidates": len(candidates), "clear_in": 0, "clear_out": 0, "ambiguous": 0,
+             "cross_encoder_scored": 0, "cache_hits": 0, "early_stopped": False}
+    if not candidates:
+        stats["rerank_ms"] = 0.0
+        return [], stats
+
+    margin = DEFAULT_MARGINS[first_pass] if margin is None else margin
+    try:
+        first_pass_scores = _first_pass_scores(query, candidates, first_pass)
+    except Exception as e:
+        print(f"⚠️ First-pass scoring with {first_pass} failed, using dense similarity: {e}")
+        first_pass, margin = "dense", DEFAULT_MARGINS["dense"]
+        first_pass_scores = _first_pass_scores(query, candidates, first_pass)
+    for chunk, score in zip(candidates, first_pass_scores):
+        chunk["first_pass_score"] = score
+    ordered = sorted(candidates, key=lambda c: c["first_pass_score"], reverse=True)
+
+    if len(ordered) <= top_n:
+        # Everything makes the cut; no decision left for the cross-encoder
+        stats["clear_in"] = len(ordered)
+        stats["rerank_ms"] = (time.perf_counter() - start) * 1000
+        return ordered, stats
+
+    boundary = (ordered[top_n - 1]["first_pass_score"] + ordered[top_n]["first_pass_score"]) / 2
+    clear_in = [c for c in ordered if c["first_pass_score"] >= boundary + margin]
+    clear_out = [c for c in ordered if c["first_pass_score"] < boundary - margin]
+    ambiguous = [c for c in ordered if boundary - margin <= c["first_pass_score"] < boundary + margin]
+    open_slots = top_n - len(clear_in)
+    stats.update(clear_in=len(clear_in), clear_out=len(clear_out), ambiguous=len(ambiguous))
+
+    qhash = query_hash(query)
+    scored = []
+    selected_ids = None
+    try:
+        for batch_start in range(0, len(ambiguous) if open_slots > 0 else 0, batch_size):
+            batch = ambiguous[batch_start:batch_start + batch_size]
+
+            predicted, hits = score_candidates(query, batch, cache, cache_namespace, cross_encoder, qhash=qhash)
+            stats["cross_encoder_scored"] += predicted
+            stats["cache_hits"] += hits
+
+            scored.extend(batch)
+            scored.sort(key=lambda c: c["rerank_score"], reverse=True)
+
+            # Settled: enough candidates scored and the latest batch didn't change the winners
+            new_selected_ids = [c["id"] for c in scored[:open_slots]]
+            if len(scored) >= open_slots and new_selected_ids == selected_ids:
+                stats["early_stopped"] = batch_start + batch_size < len(ambiguous)
+                break
+            selected_ids = new_selected_ids
+    except Exception as e:
+        # If the cross-encoder fails, continue with the first-pass ranking
+        print(f"⚠️ Cross-encoder re-ranking failed: {e}")
+        stats["rerank_ms"] = (time.perf_counter() - start) * 1000
+        return ordered, stats
+
+    unscored = [c for c in ambiguous if "rerank_score" not in c]
+    ranked = clear_in + scored[:open_slots] + scored[open_slots:] + unscored + clear_out
+    stats["rerank_ms"] = (time.perf_counter() - start) * 1000
+    return ranked, stats
@@ -0,0 +1,124 @@
+import numpy as np
+import faiss
+
+SECTION_SEARCH_MIN_CHUNKS = 50000  # Below this a flat search is exact and about as fast as coarse-to-fine
+SECTION_FANOUT = 12        # Minimum number of sections searched at chunk level in coarse-to-fine retrieval
+SECTION_MAX_FANOUT = 48    # Upper bound when flat section scores widen the search
+SECTION_FLAT_MARGIN = 0.2  # Sections within this L2 distance of the nearest one count as equally close
+PARTITIONED_SEARCH_K = 200  # Depth of the shared search before per-document top-ups
+
+
+def _hydrate(metadata, i, distance):
+    chunk_info = metadata[i]
+    return {
+        'id': int(i),
+        'distance': float(distance),
+        'text': chunk_info["text"],
+        'doc': chunk_info["doc"],
+        'page': chunk_info["page"],
+        'chunk_index': chunk_info["chunk_index"],
+        'token_count': chunk_info.get("token_count", 0),
+        'section': chunk_info.get("section_path")
+    }
+
+
+def retrieve_chunks(index, metadata, query_embedding, top_k):
+    """FAISS search; returns chunk dicts with their row id and L2 distance, nearest first."""
+    distances, indices = index.search(np.array([query_embedding]), top_k)
+
+    # Retrieve chunks with metadata
+    retrieved_chunks = []
+    for distance, i in zip(distances[0], indices[0]):
+        if i < 0:
+            continue
+        retrieved_chunks.append(_hydrate(metadata, i, distance))
+    return retrieved_chunks
+
+
+def retrieve_chunks_by_section(index, metadata, section_index, sections, query_embedding, top_k,
+                               fanout=SECTION_FANOUT, max_fanout=SECTION_MAX_FANOUT, flat_margin=SECTION_FLAT_MARGIN):
+    """Coarse-to-fine search: pick the nearest sections, then rank only their chunks.
+
+    At least `fanout` sections are searched; when the section scores are flat, every section within
+    `flat_margin` of the nearest one is included too, up to `max_fanout`. Cost grows with the number
+    of sections plus the size of the chosen sections rather than the whole corpus. Falls back to a
+    flat search when the chosen sections hold fewer than top_k chunks.
+    """
+    query = np.asarray(query_embedding, dtype="float32").reshape(1, -1)
+    distances, section_ids = section_index.search(query, min(max(fanout, max_fanout), section_index.ntotal))
+    close = int((distances[0] <= distances[0][0] + flat_margin).sum())
+    section_ids = section_ids[0][:min(max(fanout, close), max_fanout)]
+    chunk_ids = [c for s in section_ids if s >= 0 for c in sections["sections"][s]["chunk_ids"]]
+    if len(chunk_ids) < top_k:
+        return retrieve_chunks(index, metadata, query_embedding, top_k)
+
+    chunk_ids = np.array(chunk_ids, dtype="int64")
+    vectors = index.reconstruct_batch(chunk_ids)
+    distances = ((vectors - query) ** 2).sum(axis=1)
+    nearest = np.argpartition(distances, top_k - 1)[:top_k]
+    nearest = nearest[np.argsort(distances[nearest])]
+    return [_hydrate(metadata, chunk_ids[j], distances[j]) for j in nearest]
+
+
+def search_snapshot(snapshot, query_embedding, top_k, coarse=None):
+    """Retrieves top_k chunks from a store snapshot.
+
+    Sharded stores are searched scatter-gather across their shard workers. Otherwise the search is
+    coarse-to-fine when the store has a section index and `coarse` is True, or (coarse=None) when it
+    holds at least SECTION_SEARCH_MIN_CHUNKS chunks; smaller stores get an exact flat search.
+    """
+    if snapshot.shards:
+        return retrieve_chunks(snapshot.shards, snapshot.metadata, query_embedding, top_k)
+    if coarse is None:
+        coarse = snapshot.index.ntotal >= SECTION_SEARCH_MIN_CHUNKS
+    if coarse and snapshot.sections:
+        section_index, sections = snapshot.sections
+        return retrieve_chunks_by_section(snapshot.index, snapshot.metadata, section_index, sections,
+                                          query_embedding, top_k)
+    return retrieve_chunks(snapshot.index, snapshot.metadata, query_embedding, top_k)
+
+
+def retrieve_chunks_per_doc(index, metadata, query_embedding, per_doc, docs=None, search_k=PARTITIONED_SEARCH_K):
+    """One search partitioned by document: {doc: up to `per_doc` nearest chunks of that doc}.
+
+    A single search of depth `search_k` fills most documents; any document still short of `per_doc`
+    candidates gets one search restricted to its own chunks (FAISS ID selector). `index` can also be
+    the ShardedSearcher of a sharded store.
+    """
+    query = np.asarray(query_embedding, dtype="float32").reshape(1, -1)
+    if docs is None:
+        docs = sorted({meta["doc"] for meta in metadata})
+    by_doc = {doc: [] for doc in docs}
+
+    for chunk in retrieve_chunks(index, metadata, query_embedding, min(search_k, index.ntotal)):
+        if chunk["doc"] in by_doc and len(by_doc[chunk["doc"]]) < per_doc:
+            by_doc[chunk["doc"]].append(chunk)
+
+    short = [doc for doc in docs if len(by_doc[doc]) < per_doc]
+    if short:
+        doc_ids = {doc: [] for doc in short}
+        for i, meta in enumerate(metadata):
+            if meta["doc"] in doc_ids:
+                doc_ids[meta["doc"]].append(i)
+        for doc in short:
+            if not doc_ids[doc]:
+                continue
+            ids = np.array(doc_ids[doc], dtype="int64")
+            k = min(per_doc, len(ids))
+            if isinstance(index, faiss.Index):
+                distances, indices = index.search(query, k, params=faiss.SearchParameters(sel=faiss.IDSelectorBatch(ids)))
+            else:  # ShardedSearcher: each shard applies the selector to its own chunks
+                distances, indices = index.search(query, k, ids=ids)
+            by_doc[doc] = [_hydrate(metadata, i, d) for d, i in zip(distances[0], indices[0]) if i >= 0]
+    return by_doc
+
+
+def build_context(chunks):
+    """Create enhanced context with metadata"""
+    context_parts = []
+    for chunk in chunks:
+        label = f"[Document: {chunk['doc']}, Page: {chunk['page']}"
+        if chunk.get("section"):
+            label += f", Section: {chunk['section']}"
+        context_parts.append(f"{label}]\n{chunk['text']}")
+    return "\n\n---\n\n".join(context_parts)
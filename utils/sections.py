@@ -0,0 +1,228 @@
+import re
+from bisect import bisect_right
+
+import numpy as np
+import faiss
+
+from chunking import find_section_headers
+
+MAX_SECTION_CHUNKS = 24  # Larger sections are split along their sub-headers, smaller siblings merged
+TITLE_WORDS = 8
+REPEATED_TITLE_PAGES = 3  # A "header" found on this many pages is page furniture (addresses, phone numbers, UIN)
+
+_LABEL = re.compile(r"(?:(?:SECTION|CLAUSE|DEFINITION|EXCLUSION)\s+[A-Z]?[0-9]*[\.\)]?|[0-9]+[\.\)])\s*", re.I)
+_TITLE_CONNECTIVES = {"a", "an", "and", "&", "at", "by", "for", "in", "of", "on", "or", "the", "to", "under", "with"}
+_SENTENCE_STARTERS = {"A", "All", "Any", "For", "If", "In", "It", "Our", "The", "This", "Upon", "We", "When",
+                      "Where", "You", "Your"}
+_NEVER_TITLE_STARTERS = {"If", "It", "Our", "This", "Upon", "We", "When", "Where", "You", "Your"}
+
+
+def _is_header(text, pos, level):
+    """Filters header matches that are really body text: numbers in addresses, phone numbers and
+    amounts ("600 001. Toll free", "1,000. We"), and mid-sentence references ("under Section C")."""
+    before = text[max(0, pos - 20):pos].rstrip()
+    label = _LABEL.match(text, pos)
+    if label and label.group(0)[0].isdigit():
+        number = re.match(r"[0-9]+", label.group(0)).group(0)
+        if len(number) > 2 or number.startswith("0") or (before and before[-1] in "0123456789,"):
+            return False
+    elif label:
+        # "section 2." / "under Section AI-..." are references, not headers
+        previous = before.split()[-1] if before.split() else ""
+        if label.group(0)[0].islower() or (previous[:1].islower() and previous[-1:].isalpha()):
+            return False
+    return True
+
+
+def _header_title(text, pos):
+    """Short title for the header starting at `pos` ("10. Day Care Centre", "SECTION B) DEFINITIONS"),
+    cut where the body text starts; None if no title words follow the label."""
+    snippet = text[pos:pos + 120]
+    label = _LABEL.match(snippet)
+    label_end = label.end() if label else 0
+    rest = snippet[label_end:]
+    # Stop at the definition/description separator
+    separator = re.search(r":-|:\s|\s-\s|\.\s+[A-Z]|:$", rest)
+    if separator:
+        rest = rest[:separator.start()]
+
+    tokens = rest.split()
+    words = []
+    for word in tokens:
+        bare = word.strip("()[],.;:'\"“”‘’")
+        if not any(c.isalpha() for c in bare) or re.fullmatch(r"[a-z]\)", word):
+            break  # numbers and list markers ("a)") start the body
+        if bare[:1].islower() and bare.lower() not in _TITLE_CONNECTIVES:
+            break
+        if words and bare in _SENTENCE_STARTERS:
+            break
+        # An all-caps title ends at the first mixed-case word and vice versa ("BENEFITS COVERED Type of")
+        if words and len(bare) > 1 and bare[:1].isupper() and bare.isupper() != words[0].strip("()[],.;:").isupper():
+            break
+        words.append(word)
+        if len(words) == TITLE_WORDS or word.endswith((",", ";", ".")):
+            break
+    while words and words[-1].strip("()[],.;:").lower() in _TITLE_CONNECTIVES:
+        words.pop()
+    if not words or words[0].strip("()[],.;:") in _NEVER_TITLE_STARTERS or \
+            (len(words) == 1 and words[0].strip("()[],.;:") in _SENTENCE_STARTERS):
+        return None
+    following = tokens[len(words)] if len(tokens) > len(words) else ""
+    if len(words) == 1 and following[:1].islower() and following.lower() not in _TITLE_CONNECTIVES:
+        return None  # "2. No claim shall be ..." is a sentence, not a header
+    return " ".join([snippet[:label_end].strip()] + words).strip().rstrip(" :-.,;(")
+
+
+def build_section_tree(page_texts):
+    """Header tree of one document.
+
+    Returns (nodes, pages): nodes are dicts with level, title, page, offset and parent (index into
+    nodes or None), in document order; pages are (page_number, offset, normalized_text) giving each
+    page's position in the concatenated document text. Header matches in body text and titles
+    repeated on REPEATED_TITLE_PAGES or more pages (running headers/footers) are left out.
+    """
+    pages = []
+    offset = 0
+    for text, page_num in page_texts:
+        text = re.sub(r'\s+', ' ', text.strip())
+        pages.append((page_num, offset, text))
+        offset += len(text) + 1
+    doc_text = " ".join(text for _, _, text in pages)
+    page_starts = [start for _, start, _ in pages]
+
+    headers = []
+    title_pages = {}
+    for pos, level in find_section_headers(doc_text):
+        title = _header_title(doc_text, pos) if _is_header(doc_text, pos, level) else None
+        if title:
+            page = pages[bisect_right(page_starts, pos) - 1][0]
+            headers.append((pos, level, title, page))
+            title_pages.setdefault(title.lower(), set()).add(page)
+
+    nodes = []
+    open_nodes = {}  # level -> index of the latest header at that level
+    for pos, level, title, page in headers:
+        if len(title_pages[title.lower()]) >= REPEATED_TITLE_PAGES:
+            continue
+        parent = next((open_nodes[l] for l in range(level - 1, -1, -1) if l in open_nodes), None)
+        nodes.append({
+            "level": level,
+            "title": title,
+            "page": page,
+            "offset": pos,
+            "parent": parent,
+        })
+        open_nodes[level] = len(nodes) - 1
+        for deeper in [l for l in open_nodes if l > level]:
+            del open_nodes[deeper]
+    return nodes, pages
+
+
+def _chunk_offsets(doc_chunks, pages):
+    """Document-level start offset of each chunk (chunk texts are joined sentences of the page text)."""
+    page_info = {page_num: (start, text) for page_num, start, text in pages}
+    offsets = []
+    cursor = {}
+    for meta in doc_chunks:
+        start, text = page_info.get(meta["page"], (0, ""))
+        found = text.find(meta["text"][:80], cursor.get(meta["page"], 0))
+        pos = found if found >= 0 else cursor.get(meta["page"], 0)
+        cursor[meta["page"]] = pos
+        offsets.append(start + pos)
+    return offsets
+
+
+def _path(nodes, node_index):
+    path = []
+    while node_index is not None:
+        path.append(node_index)
+        node_index = nodes[node_index]["parent"]
+    return tuple(reversed(path))
+
+
+def _partition(items, depth=0):
+    """Splits contiguous (chunk_id, path) items into units of at most MAX_SECTION_CHUNKS chunks,
+    cutting at the shallowest header level that makes them fit."""
+    if len(items) <= MAX_SECTION_CHUNKS:
+        return [items]
+    if depth > 2:
+        return [items[i:i + MAX_SECTION_CHUNKS] for i in range(0, len(items), MAX_SECTION_CHUNKS)]
+
+    groups = []
+    for item in items:
+        key = item[1][depth] if len(item[1]) > depth else None
+        if groups and groups[-1][0] == key:
+            groups[-1][1].append(item)
+        else:
+            groups.append((key, [item]))
+
+    units = []
+    for _, group in groups:
+        for unit in _partition(group, depth + 1):
+            # Merge small neighbouring siblings back together
+            if units and len(units[-1]) + len(unit) <= MAX_SECTION_CHUNKS:
+                units[-1] = units[-1] + unit
+            else:
+                units.append(unit)
+    return units
+
+
+def build_sections(all_texts, chunk_meta):
+    """Builds per-document section trees and the section units used for coarse retrieval.
+
+    all_texts: {doc: [(text, page_number), ...]} as extracted; chunk_meta: chunk metadata in index
+    order. Adds "section_id" and "section_path" (e.g. "SECTION B) DEFINITIONS > 10. Day Care Centre";
+    None when no section- or clause-level header precedes the chunk) to every chunk's metadata.
+
+    Returns (sections, trees): sections are dicts with id, doc, title, chunk_ids, page_start and
+    page_end; trees maps each doc to its header nodes.
+    """
+    sections = []
+    trees = {}
+    for doc, page_texts in all_texts.items():
+        chunk_ids = [i for i, meta in enumerate(chunk_meta) if meta["doc"] == doc]
+        if not chunk_ids:
+            continue
+
+        nodes, pages = build_section_tree(page_texts)
+        trees[doc] = nodes
+        node_offsets = [node["offset"] for node in nodes]
+
+        items = []
+        for chunk_id, offset in zip(chunk_ids, _chunk_offsets([chunk_meta[i] for i in chunk_ids], pages)):
+            latest = bisect_right(node_offsets, offset) - 1
+            path = _path(nodes, latest) if latest >= 0 else ()
+            # Without a section/clause-level header above it, a numbered item alone is no citation
+            labelled = any(nodes[n]["level"] <= 1 for n in path)
+            chunk_meta[chunk_id]["section_path"] = " > ".join(nodes[n]["title"] for n in path) if labelled else None
+            items.append((chunk_id, path))
+
+        for unit in _partition(items):
+            section_id = len(sections)
+            ids = [chunk_id for chunk_id, _ in unit]
+            first = chunk_meta[ids[0]].get("section_path")
+            last = chunk_meta[ids[-1]].get("section_path")
+            title = first or f"{doc} (untitled)"
+            if last and last != first:
+                title = f"{title} … {last.split(' > ')[-1]}"
+            for chunk_id in ids:
+                chunk_meta[chunk_id]["section_id"] = section_id
+            sections.append({
+                "id": section_id,
+                "doc": doc,
+                "title": title,
+                "chunk_ids": ids,
+                "page_start": chunk_meta[ids[0]]["page"],
+                "page_end": chunk_meta[ids[-1]]["page"],
+            })
+    return sections, trees
+
+
+def build_section_index(sections, embeddings):
+    """FAISS index over section vectors (normalized mean of each section's chunk embeddings)."""
+    embeddings = np.asarray(embeddings, dtype="float32")
+    vectors = np.stack([embeddings[section["chunk_ids"]].mean(axis=0) for section in sections])
+    vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+    index = faiss.IndexFlatL2(vectors.shape[1])
+    index.add(vectors)
+    return index
@@ -0,0 +1,58 @@
+# Entry point of one shard worker process, started by shards.ShardedSearcher as
+#   python -m shard_worker <shard index path> <threads>
+# It only imports numpy and faiss, so a worker starts in well under a second and doesn't carry the
+# models (torch, sentence-transformers) that the coordinating process has loaded.
+#
+# Protocol: multiprocessing.connection framing over stdin (requests) and the original stdout
+# (replies). The first reply is the shard size; each request (queries, k, ids) is answered with
+# (distances, ids) or an exception, and None stops the worker.
+
+import os
+import sys
+from multiprocessing.connection import Connection
+
+import numpy as np
+import faiss
+
+
+def serve(index_path, threads, requests, replies):
+    faiss.omp_set_num_threads(threads)
+    index = faiss.read_index(index_path, faiss.IO_FLAG_MMAP)
+    replies.send(index.ntotal)  # ready
+    while True:
+        request = requests.recv()
+        if request is None:
+            break
+        queries, k, ids = request
+        try:
+            k = min(k, index.ntotal)
+            if k == 0:
+                replies.send((np.empty((len(queries), 0), "float32"), np.empty((len(queries), 0), "int64")))
+            elif ids is None:
+                replies.send(index.search(queries, k))
+            else:
+                # Restrict the search to a subset of global chunk ids (e.g. one document's chunks)
+                selector = faiss.IDSelectorBatch(ids)
+                replies.send(index.search(queries, k, params=faiss.SearchParameters(sel=selector)))
+        except Exception as e:
+            replies.send(e)
+
+
+def main():
+    index_path, threads = sys.argv[1], int(sys.argv[2])
+    # Keep the reply channel to ourselves: anything printed (by faiss or otherwise) goes to stderr
+    reply_fd = os.dup(sys.stdout.fileno())
+    os.dup2(sys.stderr.fileno(), sys.stdout.fileno())
+    requests = Connection(os.dup(sys.stdin.fileno()), writable=False)
+    replies = Connection(reply_fd, readable=False)
+    try:
+        serve(index_path, threads, requests, replies)
+    except EOFError:
+        pass  # coordinator went away
+    finally:
+        requests.close()
+        replies.close()
+
+
+if __name__ == "__main__":
+    main()
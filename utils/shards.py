@@ -0,0 +1,150 @@
+import os
+import sys
+import zlib
+import threading
+import weakref
+import subprocess
+from multiprocessing.connection import Connection
+
+import numpy as np
+import faiss
+
+SHARD_FILE = "shard-{}.faiss"
+SHARD_STRATEGIES = ("doc", "hash")
+UTILS_DIR = os.path.dirname(os.path.abspath(__file__))  # where shard_worker.py lives
+
+
+def assign_shards(chunk_meta, num_shards, by="doc"):
+    """Splits chunk ids into `num_shards` lists.
+
+    by="doc" keeps every document on one shard (largest documents first onto the emptiest shard);
+    by="hash" spreads chunks by a stable hash of doc/page/chunk, which balances better when a few
+    documents dominate the corpus.
+    """
+    if by not in SHARD_STRATEGIES:
+        raise ValueError(f"❌ Unknown shard strategy: {by} (use one of {SHARD_STRATEGIES})")
+
+    assignments = [[] for _ in range(num_shards)]
+    if by == "hash":
+        for i, meta in enumerate(chunk_meta):
+            key = f"{meta['doc']}:{meta['page']}:{meta['chunk_index']}".encode("utf-8")
+            assignments[zlib.crc32(key) % num_shards].append(i)
+        return assignments
+
+    by_doc = {}
+    for i, meta in enumerate(chunk_meta):
+        by_doc.setdefault(meta["doc"], []).append(i)
+    for doc in sorted(by_doc, key=lambda d: len(by_doc[d]), reverse=True):
+        smallest = min(range(num_shards), key=lambda s: len(assignments[s]))
+        assignments[smallest].extend(by_doc[doc])
+    return [sorted(ids) for ids in assignments]
+
+
+def build_shard_indexes(embeddings, assignments):
+    """One FAISS index per shard; each keeps the global chunk ids so results need no remapping."""
+    embeddings = np.asarray(embeddings, dtype="float32")
+    indexes = []
+    for ids in assignments:
+        index = faiss.IndexIDMap(faiss.IndexFlatL2(embeddings.shape[1]))
+        if ids:
+            index.add_with_ids(embeddings[ids], np.array(ids, dtype="int64"))
+        indexes.append(index)
+    return indexes
+
+
+def _start_worker(index_path, threads):
+    """Starts `python -m shard_worker` for one shard; returns (process, request conn, reply conn)."""
+    request_read, request_write = os.pipe()
+    reply_read, reply_write = os.pipe()
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [UTILS_DIR, env.get("PYTHONPATH")]))
+    # A fresh interpreter running only shard_worker: it doesn't re-import the caller's __main__
+    # (and with it torch and the models), unlike a multiprocessing "spawn" child.
+    proc = subprocess.Popen([sys.executable, "-m", "shard_worker", index_path, str(threads)],
+                            stdin=request_read, stdout=reply_write, env=env)
+    os.close(request_read)
+    os.close(reply_write)
+    return proc, Connection(request_write, readable=False), Connection(reply_read, writable=False)
+
+
+def _stop_workers(processes, requests, replies):
+    for conn in requests:
+        try:
+            conn.send(None)
+        except (OSError, EOFError):
+            pass
+    for proc in processes:
+        try:
+            proc.wait(timeout=5)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+    for conn in requests + replies:
+        conn.close()
+
+
+class ShardedSearcher:
+    """Coordinator for scatter-gather search over shard indexes served by local worker processes.
+
+    Each shard is memory-mapped by its own `python -m shard_worker` process. search() has the same
+    signature and result shape as faiss Index.search, so it can stand in for the index in
+    retrieve_chunks: the query is sent to every shard, the per-shard top-k lists are merged by
+    distance and the caller hydrates metadata from the global chunk ids. Workers stop when the
+    searcher is closed or garbage collected.
+    """
+
+    def __init__(self, shard_paths, threads_per_shard=None):
+        threads = threads_per_shard or max(1, (os.cpu_count() or 1) // len(shard_paths))
+        self._lock = threading.Lock()
+        self._processes = []
+        self._requests = []
+        self._replies = []
+        for path in shard_paths:
+            proc, request_conn, reply_conn = _start_worker(path, threads)
+            self._processes.append(proc)
+            self._requests.append(request_conn)
+            self._replies.append(reply_conn)
+        self._finalizer = weakref.finalize(self, _stop_workers, self._processes, self._requests, self._replies)
+        self.shard_sizes = []
+        for path, conn in zip(shard_paths, self._replies):
+            try:
+                self.shard_sizes.append(conn.recv())
+            except EOFError:
+                self.close()
+                raise RuntimeError(f"❌ Shard worker for {path} exited during startup")
+        self.ntotal = sum(self.shard_sizes)
+
+    @property
+    def num_shards(self):
+        return len(self._processes)
+
+    def search(self, queries, k, ids=None):
+        """Returns (distances, ids) of shape (len(queries), k), padded with inf / -1 like FAISS.
+
+        `ids` restricts the search to those global chunk ids (like an IDSelectorBatch on the index).
+        """
+        queries = np.ascontiguousarray(queries, dtype="float32")
+        if ids is not None:
+            ids = np.asarray(ids, dtype="int64")
+        with self._lock:
+            for conn in self._requests:
+                conn.send((queries, k, ids))
+            results = [conn.recv() for conn in self._replies]
+
+        for result in results:
+            if isinstance(result, Exception):
+                raise RuntimeError(f"❌ Shard search failed: {result}")
+        distances = np.hstack([d for d, _ in results])
+        ids = np.hstack([i for _, i in results])
+        distances[ids < 0] = np.inf
+
+        order = np.argsort(distances, axis=1, kind="stable")[:, :k]
+        merged_distances = np.full((len(queries), k), np.inf, dtype="float32")
+        merged_ids = np.full((len(queries), k), -1, dtype="int64")
+        width = order.shape[1]
+        merged_distances[:, :width] = np.take_along_axis(distances, order, axis=1)
+        merged_ids[:, :width] = np.take_along_axis(ids, order, axis=1)
+        merged_ids[np.isinf(merged_distances)] = -1
+        return merged_distances, merged_ids
+
+    def close(self):
+        self._finalizer()
@@ -0,0 +1,353 @@
+import json
+
+REQUIRED_FIELDS = ("answer", "justification", "source_clause", "confidence")
+ANSWER_VALUES = ("YES", "NO", "UNKNOWN")
+
+MAX_PREAMBLE_CHARS = 40  # Non-blank characters tolerated before the object ("```json", "Here is the JSON:")
+MAX_TOKEN_CHARS = 32     # Longest key or answer/confidence value the stream validator collects
+
+_LITERALS = {"True": "true", "False": "false", "None": "null"}
+_SMART_QUOTES = {"“": '"', "”": '"'}
+
+
+def iter_json_candidates(text):
+    """Yields substrings of `text` that may be JSON objects, in a single left-to-right pass.
+
+    The scan tracks brace depth and JSON strings (including escapes), so braces inside strings
+    don't count. Candidates are every outermost object and every innermost (leaf) object. Objects
+    within each set don't overlap, so each set covers at most len(text) characters and the total
+    candidate length stays below 2 * len(text). If the text ends
+    inside an object (truncated output), the unclosed outermost object is yielded last.
+    """
+    stack = []  # [start offset, has_child_object]
+    in_string = False
+    escaped = False
+
+    for i, ch in enumerate(text):
+        if in_string:
+            if escaped:
+                escaped = False
+            elif ch == "\\":
+                escaped = True
+            elif ch == '"':
+                in_string = False
+            continue
+
+        if ch == '"' and stack:
+            in_string = True
+        elif ch == "{":
+            if stack:
+                stack[-1][1] = True
+            stack.append([i, False])
+        elif ch == "}" and stack:
+            start, has_child = stack.pop()
+            if not stack or not has_child:
+                yield text[start:i + 1]
+
+    if stack:
+        yield text[stack[0][0]:]
+
+
+def repair_json(candidate):
+    """Fixes common LLM JSON defects in one string-aware pass.
+
+    Handles single-quoted strings, smart quotes, unquoted keys, Python literals (True/False/None),
+    raw newlines inside strings, trailing commas, and truncation (unterminated string, missing
+    closing braces/brackets). Valid JSON passes through unchanged.
+    """
+    out = []
+    closers = []
+    quote = None  # delimiter of the string we're in, if any
+    escaped = False
+    i = 0
+    n = len(candidate)
+
+    while i < n:
+        ch = _SMART_QUOTES.get(candidate[i], candidate[i])
+
+        if quote:
+            if escaped:
+                escaped = False
+                if ch == "'":
+                    out.pop()  # \' is not a JSON escape
+                out.append(ch)
+            elif ch == "\\":
+                escaped = True
+                out.append(ch)
+            elif ch == quote:
+                quote = None
+                out.append('"')
+            elif ch == '"':
+                out.append('\\"')  # double quote inside a single-quoted string
+            elif ch == "\n":
+                out.append("\\n")
+            elif ch == "\r":
+                out.append("\\r")
+            elif ch == "\t":
+                out.append("\\t")
+            else:
+                out.append(ch)
+            i += 1
+            continue
+
+        if ch in ('"', "'"):
+            quote = ch
+            out.append('"')
+        elif ch in "{[":
+            closers.append("}" if ch == "{" else "]")
+            out.append(ch)
+        elif ch in "}]":
+            _strip_trailing_comma(out)
+            if closers:
+                closers.pop()
+            out.append(ch)
+        elif ch.isalpha() or ch == "_":
+            j = i
+            while j < n and (candidate[j].isalnum() or candidate[j] == "_"):
+                j += 1
+            word = candidate[i:j]
+            k = j
+            while k < n and candidate[k] in " \t\r\n":
+                k += 1
+            if k < n and candidate[k] == ":" and word not in ("true", "false", "null"):
+                out.append(f'"{word}"')  # unquoted key
+            else:
+                out.append(_LITERALS.get(word, word))
+            i = j
+            continue
+        else:
+            out.append(ch)
+        i += 1
+
+    # Truncated output: close the open string and containers
+    if quote:
+        if escaped:
+            out.pop()
+        out.append('"')
+    while closers:
+        _strip_trailing_comma(out)
+        out.append(closers.pop())
+    return "".join(out)
+
+
+def _strip_trailing_comma(out):
+    j = len(out) - 1
+    while j >= 0 and out[j] in (" ", "\n", "\r", "\t"):
+        j -= 1
+    if j >= 0 and out[j] == ",":
+        del out[j]
+
+
+def validate_response(obj):
+    """Checks `obj` against the response schema. Returns a normalized dict, or None if invalid.
+
+    answer must be YES/NO/UNKNOWN (any case), justification a string, source_clause a string or
+    null (other values are serialized), confidence a number in [0, 1] (percentages up to 100 are
+    scaled down).
+    """
+    if not isinstance(obj, dict) or not all(key in obj for key in REQUIRED_FIELDS):
+        return None
+
+    answer = obj["answer"]
+    if not isinstance(answer, str) or answer.strip().upper() not in ANSWER_VALUES:
+        return None
+
+    justification = obj["justification"]
+    if not isinstance(justification, str):
+        return None
+
+    source_clause = obj["source_clause"]
+    if source_clause is not None and not isinstance(source_clause, str):
+        source_clause = json.dumps(source_clause, ensure_ascii=False)  # e.g. {"section": "3.2"}
+    if isinstance(source_clause, str) and source_clause.strip().lower() in ("", "null", "none"):
+        source_clause = None
+
+    confidence = obj["confidence"]
+    if isinstance(confidence, bool):
+        return None
+    try:
+        confidence = float(confidence)
+    except (TypeError, ValueError):
+        return None
+    if 1.0 < confidence <= 100.0:
+        confidence /= 100.0
+    if not 0.0 <= confidence <= 1.0:
+        return None
+
+    normalized = dict(obj)
+    normalized.update(
+        answer=answer.strip().upper(),
+        justification=justification,
+        source_clause=source_clause,
+        confidence=confidence,
+    )
+    return normalized
+
+
+def parse_llm_response(text):
+    """Finds, repairs and validates the response object in raw model output. Returns a dict or None."""
+    if not text:
+        return None
+
+    for candidate in iter_json_candidates(text):
+        for attempt in (candidate, None):
+            if attempt is None:
+                attempt = repair_json(candidate)
+                if attempt == candidate:
+                    break
+            try:
+                parsed = json.loads(attempt)
+            except (json.JSONDecodeError, RecursionError):
+                continue
+            valid = validate_response(parsed)
+            if valid is not None:
+                return valid
+            break  # well-formed but not our schema: no point repairing it
+    return None
+
+
+class StreamValidator:
+    """Incremental check of streamed model output against the response schema.
+
+    feed() each text delta as it arrives; it returns OK while the output can still become a valid
+    response, DONE once the top-level object has closed and validates (the rest of the stream can be
+    dropped), or ABORT as soon as the output can no longer become one, with the cause in `reason`:
+    - more than MAX_PREAMBLE_CHARS of prose before the opening brace,
+    - an answer that isn't a string or can't be completed to YES/NO/UNKNOWN,
+    - a confidence value containing something other than a number,
+    - the object closing without passing validate_response.
+    Only keys and the answer/confidence values are collected (both bounded by MAX_TOKEN_CHARS), so
+    each character costs O(1) and the total cost is linear in the output length.
+    """
+
+    OK = "ok"
+    DONE = "done"
+    ABORT = "abort"
+
+    def __init__(self):
+        self.text = []
+        self.status = self.OK
+        self.reason = None
+        self._preamble = 0
+        self._closed_invalid = False  # an earlier top-level object closed without validating
+        self._depth = 0
+        self._quote = None      # delimiter of the string being scanned
+        self._escaped = False
+        self._key = None        # top-level key whose value comes next
+        self._token = None      # characters of the current top-level key or value
+        self._in_value = False
+
+    def _abort(self, reason):
+        self.status = self.ABORT
+        self.reason = reason
+        return self.status
+
+    def feed(self, delta):
+        if self.status != self.OK:
+            return self.status
+        for ch in delta:
+            self.text.append(ch)
+            ch = _SMART_QUOTES.get(ch, ch)
+            if self._depth == 0:
+                if ch == "{":
+                    self._depth = 1
+                    self._token = None
+                elif not ch.isspace():
+                    self._preamble += 1
+                    if self._preamble > MAX_PREAMBLE_CHARS:
+                        if self._closed_invalid:
+                            return self._abort("object closed without a valid response")
+                        return self._abort("prose before the JSON object")
+                continue
+
+            if self._quote:
+                if self._escaped:
+                    self._escaped = False
+                elif ch == "\\":
+                    self._escaped = True
+                elif ch == self._quote:
+                    self._quote = None
+                    if self._depth == 1 and self._token is not None:
+                        if self._end_token() == self.ABORT:
+                            return self.status
+                    continue
+                if self._depth == 1 and self._token is not None and self._collect(ch) == self.ABORT:
+                    return self.status
+                continue
+
+            if ch in ('"', "'"):
+                self._quote = ch
+                if self._depth == 1:
+                    if self._in_value and self._key == "confidence" and self._token:
+                        return self._abort("confidence is not a number")
+                    if self._token is None:
+                        self._token = []
+            elif ch in "{[":
+                if self._depth == 1 and self._in_value and self._key in ("answer", "confidence"):
+                    return self._abort(f"{self._key} is not a scalar value")
+                self._depth += 1
+            elif ch in "}]":
+                self._depth -= 1
+                if self._depth == 0:
+                    if self._token is not None and self._end_token() == self.ABORT:
+                        return self.status
+                    if parse_llm_response("".join(self.text)) is not None:
+                        self.status = self.DONE
+                        return self.status
+                    # A short example object ('{"answer": "NO"} ...') may still be followed by the real one
+                    self._preamble = len("".join(self.text).strip())
+                    self._closed_invalid = True
+                    if self._preamble > MAX_PREAMBLE_CHARS:
+                        return self._abort("object closed without a valid response")
+                    self._key, self._token, self._in_value = None, None, False
+            elif self._depth == 1:
+                if ch == ":":
+                    if self._token is not None:
+                        self._end_token()
+                    self._in_value = True
+                elif ch == ",":
+                    if self._token is not None and self._end_token() == self.ABORT:
+                        return self.status
+                    self._in_value = False
+                    self._key = None
+                elif not ch.isspace():
+                    # Unquoted keys and bare values (numbers, true/false/null)
+                    if self._in_value and self._key == "answer" and self._token is None:
+                        return self._abort("answer is not a string")
+                    if self._token is None:
+                        self._token = []
+                    if self._collect(ch) == self.ABORT:
+                        return self.status
+        return self.status
+
+    def _collect(self, ch):
+        """Adds a character to the current key or checked value; other values (justification,
+        source_clause) aren't collected."""
+        if not self._in_value:
+            # Longer keys can't be one of ours; truncating keeps the work per character constant
+            if len(self._token) < MAX_TOKEN_CHARS:
+                self._token.append(ch)
+            return self.OK
+        if self._key == "confidence":
+            self._token.append(ch)
+            if ch.upper() not in "0123456789.+-E \t\n\r":
+                return self._abort(f"confidence {''.join(self._token).strip()!r} is not a number")
+            if len(self._token) > MAX_TOKEN_CHARS:
+                return self._abort("confidence is not a number")
+        elif self._key == "answer":
+            self._token.append(ch)
+            value = "".join(self._token).strip().upper()
+            if len(self._token) > MAX_TOKEN_CHARS or not any(v.startswith(value) for v in ANSWER_VALUES):
+                return self._abort(f"answer {value!r} is not YES/NO/UNKNOWN")
+        return self.OK
+
+    def _end_token(self):
+        token = "".join(self._token).strip()
+        self._token = None
+        if not self._in_value:
+            self._key = token
+            return self.OK
+        if self._key == "answer" and token.upper() not in ANSWER_VALUES:
+            return self._abort(f"answer {token!r} is not YES/NO/UNKNOWN")
+        self._key = None
+        return self.OK
@@ -0,0 +1,130 @@
+import os
+import re
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from vector_store import VECTOR_STORE_DIR, VectorStoreManager, get_vector_store_manager
+
+# === Tenant layout ===
+# outputs/vector_store/                   -> default store (no tenant)
+# outputs/vector_store/tenants/<tenant>/  -> one versioned store per insurer client (CURRENT + versions/)
+TENANTS_DIR = "tenants"
+TENANT_NAME_PATTERN = re.compile(r"^[A-Za-z0-9][A-Za-z0-9_-]{0,63}$")
+DEFAULT_MEMORY_BUDGET_MB = 2048
+
+
+def tenant_store_dir(tenant, root=VECTOR_STORE_DIR):
+    """Store directory of a tenant. Names are restricted so they can't escape the tenants directory."""
+    if not TENANT_NAME_PATTERN.match(tenant or ""):
+        raise ValueError(f"❌ Invalid tenant name: {tenant!r}")
+    return os.path.join(root, TENANTS_DIR, tenant)
+
+
+def list_tenants(root=VECTOR_STORE_DIR):
+    """Tenants that have a store on disk."""
+    tenants_root = os.path.join(root, TENANTS_DIR)
+    if not os.path.isdir(tenants_root):
+        return []
+    return sorted(t for t in os.listdir(tenants_root)
+                  if TENANT_NAME_PATTERN.match(t) and os.path.isdir(os.path.join(tenants_root, t)))
+
+
+class TenantStoreRegistry:
+    """Lazily loaded per-tenant vector stores under a shared memory budget.
+
+    A tenant's store is opened on its first query and kept hot-reloading through its own
+    VectorStoreManager. When the resident size of all loaded tenants exceeds the budget, the least
+    recently used tenants are evicted; tenants with queries in flight are never evicted.
+    """
+
+    def __init__(self, root=VECTOR_STORE_DIR, memory_budget_mb=DEFAULT_MEMORY_BUDGET_MB, grace_period=60.0):
+        self.root = root
+        self.memory_budget_bytes = int(memory_budget_mb * 1024 * 1024)
+        self.grace_period = grace_period
+        self._lock = threading.Lock()
+        self._managers = OrderedDict()  # tenant -> VectorStoreManager, least recently used first
+        self.loads = 0
+        self.hits = 0
+        self.evictions = 0
+
+    def _manager(self, tenant):
+        with self._lock:
+            manager = self._managers.get(tenant)
+            if manager is None:
+                store_dir = tenant_store_dir(tenant, self.root)
+                if not os.path.isdir(store_dir):
+                    raise FileNotFoundError(f"❌ No vector store for tenant '{tenant}' in {store_dir}")
+                manager = VectorStoreManager(store_dir, grace_period=self.grace_period)
+                self._managers[tenant] = manager
+                self.loads += 1
+            else:
+                self.hits += 1
+            self._managers.move_to_end(tenant)
+            return manager
+
+    def _evict(self, keep):
+        with self._lock:
+            sizes = {tenant: manager.resident_bytes() for tenant, manager in self._managers.items()}
+            total = sum(sizes.values())
+            for tenant, manager in list(self._managers.items()):
+                if total <= self.memory_budget_bytes:
+                    break
+                if tenant == keep or manager.in_flight():
+                    continue
+                del self._managers[tenant]
+                total -= sizes[tenant]
+                self.evictions += 1
+                print(f"♻️ Evicted tenant '{tenant}' ({sizes[tenant] / 1024 / 1024:.1f} MB)")
+
+    @contextmanager
+    def acquire(self, tenant):
+        """Pins the current snapshot of a tenant's store for one query, loading it if needed."""
+        manager = self._manager(tenant)
+        with manager.acquire() as snapshot:
+            self._evict(keep=tenant)
+            yield snapshot
+
+    def stats(self):
+        with self._lock:
+            resident = {tenant: manager.resident_bytes() for tenant, manager in self._managers.items()}
+            return {
+                "tenants_resident": list(resident),
+                "resident_mb": {tenant: size / 1024 / 1024 for tenant, size in resident.items()},
+                "total_resident_mb": sum(resident.values()) / 1024 / 1024,
+                "memory_budget_mb": self.memory_budget_bytes / 1024 / 1024,
+                "loads": self.loads,
+                "hits": self.hits,
+                "evictions": self.evictions,
+            }
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_tenant_registry():
+    """Process-wide registry; the budget comes from TENANT_MEMORY_BUDGET_MB (default 2048)."""
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            budget = float(os.getenv("TENANT_MEMORY_BUDGET_MB", DEFAULT_MEMORY_BUDGET_MB))
+            _registry = TenantStoreRegistry(memory_budget_mb=budget)
+        return _registry
+
+
+def acquire_store(tenant=None):
+    """Pins a snapshot of the tenant's store, or of the default store when tenant is None."""
+    if tenant is None:
+        return get_vector_store_manager().acquire()
+    return get_tenant_registry().acquire(tenant)
+
+
+def preload_store(tenant=None):
+    """Loads the current version of a store (index, metadata, shard workers) if it isn't live yet.
+
+    Called before a query's Deadline starts, so neither the first load nor a hot reload after a
+    rebuild is paid for out of the query's budget; the query then pins the already loaded snapshot.
+    """
+    with acquire_store(tenant):
+        pass
@@ -0,0 +1,353 @@
+import os
+import json
+import pickle
+import shutil
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+import faiss
+
+# === Store layout ===
+# outputs/vector_store/
+#   CURRENT                  -> name of the live version (swapped atomically)
+#   versions/<version>/      -> immutable snapshot: index.faiss, chunks.pkl, meta.pkl, manifest.json
+# Stores built before versioning (flat index.faiss/meta.pkl in the root) are still readable as "legacy".
+VECTOR_STORE_DIR = "outputs/vector_store"
+VERSIONS_DIR = "versions"
+CURRENT_POINTER = "CURRENT"
+MANIFEST_FILE = "manifest.json"
+LEGACY_VERSION = "legacy"
+
+INDEX_FILE = "index.faiss"
+CHUNKS_FILE = "chunks.pkl"
+META_FILE = "meta.pkl"
+SECTION_INDEX_FILE = "sections.faiss"
+SECTIONS_FILE = "sections.pkl"
+
+
+def _new_version_name():
+    """Sortable, unique version name (UTC timestamp + pid)."""
+    return datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S%fZ") + f"-{os.getpid()}"
+
+
+def read_current_version(store_dir=VECTOR_STORE_DIR):
+    """Returns the version name CURRENT points at, or None for a legacy/unversioned store."""
+    try:
+        with open(os.path.join(store_dir, CURRENT_POINTER), "r", encoding="utf-8") as f:
+            version = f.read().strip()
+        return version or None
+    except FileNotFoundError:
+        return None
+
+
+def version_path(store_dir, version):
+    """Directory holding the files of a given version."""
+    if version == LEGACY_VERSION:
+        return store_dir
+    return os.path.join(store_dir, VERSIONS_DIR, version)
+
+
+def begin_version(store_dir=VECTOR_STORE_DIR):
+    """Creates a private staging directory for a new version. Returns (version, staging_dir)."""
+    version = _new_version_name()
+    staging_dir = os.path.join(store_dir, VERSIONS_DIR, f".staging-{version}")
+    os.makedirs(staging_dir)
+    return version, staging_dir
+
+
+def commit_version(store_dir, version, staging_dir, manifest_extra=None, keep_versions=3):
+    """Seals a staged version and atomically points CURRENT at it."""
+    files = {}
+    for name in sorted(os.listdir(staging_dir)):
+        files[name] = os.path.getsize(os.path.join(staging_dir, name))
+
+    manifest = {
+        "version": version,
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "files": files,
+    }
+    if manifest_extra:
+        manifest.update(manifest_extra)
+
+    with open(os.path.join(staging_dir, MANIFEST_FILE), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+
+    # rename() of a directory is atomic on the same filesystem, so readers never see a half-written version
+    final_dir = version_path(store_dir, version)
+    os.rename(staging_dir, final_dir)
+
+    # Swap the pointer: write a temp file, then os.replace() it over CURRENT
+    tmp_pointer = os.path.join(store_dir, f".{CURRENT_POINTER}.{os.getpid()}.tmp")
+    with open(tmp_pointer, "w", encoding="utf-8") as f:
+        f.write(version)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_pointer, os.path.join(store_dir, CURRENT_POINTER))
+
+    prune_versions(store_dir, keep_versions=keep_versions)
+    return manifest
+
+
+def publish_vector_store(index, chunks, metadata, store_dir=VECTOR_STORE_DIR, manifest_extra=None, keep_versions=3,
+                         artifacts=None):
+    """Writes index + chunks + metadata as a new version and makes it current. Returns the version name.
+
+    artifacts: optional {filename: object} published in the same version; FAISS indexes are written
+    with faiss.write_index, anything else is pickled.
+    """
+    version, staging_dir = begin_version(store_dir)
+    try:
+        faiss.write_index(index, os.path.join(staging_dir, INDEX_FILE))
+        with open(os.path.join(staging_dir, CHUNKS_FILE), "wb") as f:
+            pickle.dump(chunks, f)
+        with open(os.path.join(staging_dir, META_FILE), "wb") as f:
+            pickle.dump(metadata, f)
+        for name, artifact in (artifacts or {}).items():
+            path = os.path.join(staging_dir, name)
+            if isinstance(artifact, faiss.Index):
+                faiss.write_index(artifact, path)
+            else:
+                with open(path, "wb") as f:
+                    pickle.dump(artifact, f)
+
+        extra = {"num_chunks": len(metadata), "dimension": index.d}
+        if manifest_extra:
+            extra.update(manifest_extra)
+        commit_version(store_dir, version, staging_dir, manifest_extra=extra, keep_versions=keep_versions)
+    except Exception:
+        shutil.rmtree(staging_dir, ignore_errors=True)
+        raise
+    return version
+
+
+def prune_versions(store_dir=VECTOR_STORE_DIR, keep_versions=3, min_age_seconds=300):
+    """Deletes old version directories, always keeping the current one and the newest `keep_versions`.
+
+    Versions younger than `min_age_seconds` are kept so that readers which resolved CURRENT just
+    before a swap can still open them. Files already mapped by a reader stay valid after deletion.
+    """
+    versions_root = os.path.join(store_dir, VERSIONS_DIR)
+    if not os.path.isdir(versions_root):
+        return []
+
+    current = read_current_version(store_dir)
+    versions = sorted(v for v in os.listdir(versions_root) if not v.startswith("."))
+    stale = [v for v in versions[:-keep_versions] if v != current] if keep_versions > 0 else []
+
+    removed = []
+    now = time.time()
+    for version in stale:
+        path = os.path.join(versions_root, version)
+        if now - os.path.getmtime(path) < min_age_seconds:
+            continue
+        shutil.rmtree(path, ignore_errors=True)
+        removed.append(version)
+    return removed
+
+
+class VectorStoreSnapshot:
+    """One immutable, loaded version of the vector store."""
+
+    def __init__(self, store_dir, version):
+        self.store_dir = store_dir
+        self.version = version
+        self.path = version_path(store_dir, version)
+        self.manifest = self._load_manifest()
+
+        # Memory-map the index so old and new snapshots can coexist cheaply during a swap
+        self.index = faiss.read_index(os.path.join(self.path, INDEX_FILE), faiss.IO_FLAG_MMAP)
+        with open(os.path.join(self.path, META_FILE), "rb") as f:
+            self.metadata = pickle.load(f)
+        self._chunks = None
+        self._sections = None
+        self._warm = None
+        # Shard workers start with the snapshot, so the first query doesn't wait for them
+        self._shards = self._start_shards()
+
+    def _load_manifest(self):
+        manifest_path = os.path.join(self.path, MANIFEST_FILE)
+        if not os.path.exists(manifest_path):
+            return {"version": self.version}
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    @property
+    def chunks(self):
+        """Raw chunk texts (loaded on first use, the query path only needs metadata)."""
+        if self._chunks is None:
+            with open(os.path.join(self.path, CHUNKS_FILE), "rb") as f:
+                self._chunks = pickle.load(f)
+        return self._chunks
+
+    @property
+    def sections(self):
+        """(section index, section data) for coarse-to-fine retrieval, or None for stores built without it."""
+        if self._sections is None:
+            index_path = os.path.join(self.path, SECTION_INDEX_FILE)
+            if not os.path.exists(index_path):
+                self._sections = False
+            else:
+                with open(os.path.join(self.path, SECTIONS_FILE), "rb") as f:
+                    self._sections = (faiss.read_index(index_path), pickle.load(f))
+        return self._sections or None
+
+    def _start_shards(self):
+        num_shards = self.manifest.get("shards")
+        if not num_shards:
+            return None
+        from shards import ShardedSearcher, SHARD_FILE
+        return ShardedSearcher([os.path.join(self.path, SHARD_FILE.format(i)) for i in range(num_shards)])
+
+    @property
+    def shards(self):
+        """ShardedSearcher over this version's shard indexes, or None for unsharded stores."""
+        return self._shards
+
+    @property
+    def warm(self):
+        """WarmTable of precomputed hot-query retrieval, or None until the warm-up job has run for this version."""
+        if self._warm is None:
+            # The table is written after the version is published, so keep looking until it appears
+            from warmup import load_warm_table
+            self._warm = load_warm_table(self.path)
+        return self._warm
+
+    def resident_bytes(self):
+        """Approximate memory held by this snapshot: on-disk size of every file loaded so far."""
+        loaded = [INDEX_FILE, META_FILE]
+        if self._chunks is not None:
+            loaded.append(CHUNKS_FILE)
+        if self._sections:
+            loaded += [SECTION_INDEX_FILE, SECTIONS_FILE]
+        if self._shards is not None:
+            from shards import SHARD_FILE
+            loaded += [SHARD_FILE.format(i) for i in range(self._shards.num_shards)]
+        if self._warm is not None:
+            from warmup import WARM_FILE
+            loaded.append(WARM_FILE)
+        return sum(os.path.getsize(os.path.join(self.path, name)) for name in loaded)
+
+
+def load_current_snapshot(store_dir=VECTOR_STORE_DIR):
+    """Loads whatever version CURRENT points at (or the legacy flat store)."""
+    return VectorStoreSnapshot(store_dir, read_current_version(store_dir) or LEGACY_VERSION)
+
+
+class VectorStoreManager:
+    """Hot-reloading access to the current vector store for long-running processes.
+
+    Every acquire() re-reads the CURRENT pointer; when it has moved, the new version is loaded and
+    handed to new queries while queries already holding the old snapshot finish on it. Retired
+    snapshots are dropped after `grace_period` seconds, at which point they are unmapped as soon as
+    the last in-flight query releases them. A new version is loaded outside the lock: while one
+    thread loads it, other queries keep getting the previous snapshot instead of waiting.
+    """
+
+    def __init__(self, store_dir=VECTOR_STORE_DIR, grace_period=60.0):
+        self.store_dir = store_dir
+        self.grace_period = grace_period
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()  # one version load at a time
+        self._current = None
+        self._retired = []  # list of (snapshot, retired_at)
+        self._in_flight = {}  # version -> number of queries using it
+
+    def _is_current(self, version):
+        with self._lock:
+            return self._current is not None and self._current.version == version
+
+    def _refresh(self):
+        """Loads the version CURRENT points at if it isn't live yet. Called without holding _lock."""
+        version = read_current_version(self.store_dir) or LEGACY_VERSION
+        if self._is_current(version):
+            return
+
+        # Only the very first load makes queries wait; later ones keep serving the old snapshot
+        if not self._load_lock.acquire(blocking=self._current is None):
+            return
+        try:
+            if self._is_current(version):  # loaded by another thread meanwhile
+                return
+            try:
+                snapshot = VectorStoreSnapshot(self.store_dir, version)
+            except Exception as e:
+                if self._current is None:
+                    raise
+                # Keep serving the previous version if the new one can't be opened
+                print(f"⚠️ Failed to load vector store version {version}: {e}")
+                return
+
+            with self._lock:
+                if self._current is not None:
+                    print(f"🔄 Vector store switched {self._current.version} -> {version}")
+                    self._retired.append((self._current, time.monotonic()))
+                self._current = snapshot
+        finally:
+            self._load_lock.release()
+
+    def _release_retired(self):
+        now = time.monotonic()
+        kept = []
+        for snapshot, retired_at in self._retired:
+            if now - retired_at < self.grace_period:
+                kept.append((snapshot, retired_at))
+            elif self._in_flight.get(snapshot.version):
+                print(f"⏳ Releasing version {snapshot.version} with {self._in_flight[snapshot.version]} queries still in flight")
+        self._retired = kept
+
+    def current(self):
+        """Returns the live snapshot without tracking usage."""
+        self._refresh()
+        with self._lock:
+            self._release_retired()
+            return self._current
+
+    @contextmanager
+    def acquire(self):
+        """Pins the current snapshot for the duration of one query."""
+        self._refresh()
+        with self._lock:
+            self._release_retired()
+            snapshot = self._current
+            self._in_flight[snapshot.version] = self._in_flight.get(snapshot.version, 0) + 1
+        try:
+            yield snapshot
+        finally:
+            with self._lock:
+                self._in_flight[snapshot.version] -= 1
+                if not self._in_flight[snapshot.version]:
+                    del self._in_flight[snapshot.version]
+
+    def resident_bytes(self):
+        """Memory held by the live and retired snapshots (0 before the first query)."""
+        with self._lock:
+            snapshots = [s for s, _ in self._retired] + ([self._current] if self._current else [])
+            return sum(s.resident_bytes() for s in snapshots)
+
+    def in_flight(self):
+        with self._lock:
+            return sum(self._in_flight.values())
+
+    def stats(self):
+        with self._lock:
+            return {
+                "current_version": self._current.version if self._current else None,
+                "retired_versions": [s.version for s, _ in self._retired],
+                "in_flight": dict(self._in_flight),
+            }
+
+
+_managers = {}
+_managers_lock = threading.Lock()
+
+
+def get_vector_store_manager(store_dir=VECTOR_STORE_DIR):
+    """Process-wide manager per store directory."""
+    with _managers_lock:
+        if store_dir not in _managers:
+            _managers[store_dir] = VectorStoreManager(store_dir)
+        return _managers[store_dir]
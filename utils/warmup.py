@@ -0,0 +1,120 @@
+import os
+import json
+import pickle
+from collections import Counter
+from datetime import datetime, timezone
+
+import numpy as np
+
+from query_log import read_query_log
+
+# Precomputed retrieval for the most frequent questions, stored next to the index it was computed
+# from (versions/<v>/warm.pkl), so it is replaced together with the store on every rebuild.
+WARM_FILE = "warm.pkl"
+WARMUP_QUERIES = 50  # Hot queries precomputed per store version
+DEFAULT_RETRIEVAL_PARAMS = {"num_chunks": 15, "adaptive": False, "compress": False}
+
+
+def warm_query_key(query):
+    """Case-, whitespace- and trailing-punctuation-insensitive form used to match repeated questions."""
+    return " ".join(query.lower().split()).rstrip("?.! ")
+
+
+def warm_key(query, num_chunks=15, adaptive=False, compress=False):
+    """Lookup key: the normalized query plus the parameters that change what retrieval returns."""
+    return (warm_query_key(query), int(num_chunks), bool(adaptive), bool(compress))
+
+
+def hot_queries(n=WARMUP_QUERIES, log_path=None, seed_path=None, tenant=None):
+    """The n most frequent (query, retrieval params) of the query log, topped up from a seed file.
+
+    Only single-question records ("app"/"cli") of the given tenant count. The seed file is a list of
+    {"query": ...} objects like test_cases.json; seed queries use DEFAULT_RETRIEVAL_PARAMS.
+    """
+    counts = Counter()
+    latest = {}
+    if log_path and os.path.exists(log_path):
+        for record in read_query_log(log_path):
+            params = record.get("params") or {}
+            if record.get("source") not in ("app", "cli") or not record.get("query") or params.get("tenant") != tenant:
+                continue
+            retrieval_params = {name: params.get(name, default) for name, default in DEFAULT_RETRIEVAL_PARAMS.items()}
+            key = warm_key(record["query"], **retrieval_params)
+            counts[key] += 1
+            latest[key] = (record["query"], retrieval_params)
+
+    picked = [latest[key] for key, _ in counts.most_common(n)]
+    if len(picked) < n and seed_path and os.path.exists(seed_path):
+        with open(seed_path, "r", encoding="utf-8") as f:
+            seeds = [case["query"] for case in json.load(f) if case.get("query")]
+        seen = {warm_key(query, **params) for query, params in picked}
+        for query in seeds:
+            key = warm_key(query, **DEFAULT_RETRIEVAL_PARAMS)
+            if key not in seen and len(picked) < n:
+                seen.add(key)
+                picked.append((query, dict(DEFAULT_RETRIEVAL_PARAMS)))
+    return picked
+
+
+class WarmTable:
+    """Query embeddings and retrieval results (re-ranked, optionally compressed context chunks and
+    their retrieval stats) of the hot queries of one store version."""
+
+    def __init__(self, data):
+        self.version = data["version"]
+        self.built_at = data["built_at"]
+        self.embeddings = data["embeddings"]
+        self._rows = {query: i for i, query in enumerate(data["queries"])}
+        self._entries = data["entries"]
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, query, num_chunks=15, adaptive=False, compress=False):
+        """(context chunks, retrieval stats) for this query and parameters, or None."""
+        entry = self._entries.get(warm_key(query, num_chunks, adaptive, compress))
+        if entry is None:
+            return None
+        return [dict(chunk) for chunk in entry["chunks"]], dict(entry["stats"])
+
+    def embedding(self, query):
+        """Precomputed embedding of the query (with any parameters), or None."""
+        row = self._rows.get(warm_query_key(query))
+        return self.embeddings[row] if row is not None else None
+
+
+def build_warm_table(version, queries, embeddings, results):
+    """Table data for `queries` [(query, params)], their embeddings and [(context chunks, stats)]."""
+    rows = {}
+    for (query, _), embedding in zip(queries, embeddings):
+        rows.setdefault(warm_query_key(query), embedding)
+    entries = {
+        warm_key(query, **params): {"query": query, "chunks": chunks, "stats": stats}
+        for (query, params), (chunks, stats) in zip(queries, results)
+    }
+    return {
+        "version": version,
+        "built_at": datetime.now(timezone.utc).isoformat(),
+        "queries": list(rows),
+        "embeddings": np.asarray(list(rows.values()), dtype="float32"),
+        "entries": entries,
+    }
+
+
+def write_warm_table(version_dir, data):
+    """Writes the table into a version directory; renamed into place so readers never see a partial file."""
+    path = os.path.join(version_dir, WARM_FILE)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        pickle.dump(data, f)
+    os.replace(tmp_path, path)
+    return path
+
+
+def load_warm_table(version_dir):
+    """WarmTable of a version directory, or None if it hasn't been warmed up."""
+    path = os.path.join(version_dir, WARM_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path, "rb") as f:
+        return WarmTable(pickle.load(f))